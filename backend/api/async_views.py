@@ -0,0 +1,134 @@
+"""Асинхронные представления для чтения рецептов и ингредиентов под ASGI.
+
+DRF 3.14 не поддерживает асинхронные представления, поэтому под ASGI
+каждый запрос к ViewSet выполняется в потоке ``sync_to_async``. Самые
+частые запросы — анонимное чтение списка и карточки рецепта (из кэша
+ответов) и поиск ингредиентов — обрабатываются здесь без DRF: ожидание
+кэша и БД не занимает поток. Остальные запросы (изменение данных,
+запросы с токеном, браузерный API) передаются ViewSet'ам без изменений.
+
+Маршруты подключаются в ``api/urls.py`` только при ``ASGI_MODE``.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from base.models import Ingredient, Recipe
+from .conditional import conditional_response, make_etag
+from .search import search_ingredients
+from .serializers import IngredientSerializer, RecipeSerializer
+from .views import IngredientViewSet, RecipeViewSet, recipe_etag
+from . import ingredient_index, response_cache
+
+# Те же действия, что регистрирует DefaultRouter
+recipe_list_view = RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+recipe_detail_view = RecipeViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy',
+})
+ingredient_list_view = IngredientViewSet.as_view({'get': 'list'})
+
+
+def is_anonymous_read(request):
+    """Анонимный запрос на чтение, ожидающий JSON."""
+    return (
+        request.method in ('GET', 'HEAD')
+        and 'HTTP_AUTHORIZATION' not in request.META
+        and 'text/html' not in request.headers.get('Accept', '')
+    )
+
+
+def render(data):
+    """Ответ в том же виде, что у ``JSONRenderer`` DRF."""
+    response = HttpResponse(
+        JSONRenderer().render(data), content_type='application/json')
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+async def recipe_list(request):
+    """Список рецептов: анонимам отдаётся закэшированная страница."""
+    if is_anonymous_read(request):
+        data = await sync_to_async(response_cache.get_list)(
+            Request(request, authenticators=()))
+        if data is not None:
+            return render(data)
+    return await sync_to_async(recipe_list_view)(request)
+
+
+async def recipe_detail(request, pk):
+    """Карточка рецепта для анонимов с поддержкой условных запросов."""
+    if not is_anonymous_read(request):
+        return await sync_to_async(recipe_detail_view)(request, pk=pk)
+    drf_request = Request(request, authenticators=())
+    entry = await sync_to_async(response_cache.get_detail)(drf_request, pk)
+    if entry:
+        return conditional_response(
+            request,
+            etag=entry['etag'],
+            last_modified=entry['updated_at'],
+            get_response=lambda: render(entry['data']),
+            vary_on_user=True,
+        )
+
+    recipe = await Recipe.objects.with_user_annotations(
+        drf_request.user).filter(pk=pk).afirst()
+    if recipe is None:
+        # Ответ 404 формирует DRF
+        return await sync_to_async(recipe_detail_view)(request, pk=pk)
+    etag = recipe_etag(recipe)
+    data = None
+
+    def get_response():
+        nonlocal data
+        # Связанные объекты уже загружены, сериализация не обращается к БД
+        data = RecipeSerializer(
+            recipe, context={'request': drf_request}).data
+        return render(data)
+
+    response = conditional_response(
+        request,
+        etag=etag,
+        last_modified=recipe.updated_at,
+        get_response=get_response,
+        vary_on_user=True,
+    )
+    if data is not None:
+        await sync_to_async(response_cache.set_detail)(
+            drf_request, recipe, etag, data)
+    return response
+
+
+async def ingredient_list(request):
+    """Поиск ингредиентов (см. ``IngredientViewSet.list``)."""
+    if not is_anonymous_read(request):
+        return await sync_to_async(ingredient_list_view)(request)
+    name = request.GET.get('name', '')
+    query = request.GET.get('search', '').strip()
+    if query:
+        ingredients = [
+            ingredient async for ingredient in search_ingredients(
+                Ingredient.objects.all(), query
+            )[:settings.INGREDIENT_SEARCH_LIMIT]
+        ]
+        return render(IngredientSerializer(ingredients, many=True).data)
+
+    index = await ingredient_index.aget_index()
+    return conditional_response(
+        request,
+        etag=make_etag(index.version, ingredient_index.normalize(name)),
+        get_response=lambda: render(IngredientSerializer(
+            index.search(name, settings.INGREDIENT_SEARCH_LIMIT) if name
+            else index.ingredients,
+            many=True
+        ).data),
+    )
+
+
+# Как и представления DRF, не требуют CSRF-токена: API использует
+# авторизацию по токену. Декоратор csrf_exempt в Django 4.2 не
+# поддерживает асинхронные функции.
+for view in (recipe_list, recipe_detail, ingredient_list):
+    view.csrf_exempt = True
@@ -0,0 +1,32 @@
+"""Условные GET-запросы (ETag / Last-Modified) для представлений DRF."""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Строит ETag из значений, от которых зависит содержимое ответа."""
+    return quote_etag(hashlib.md5(
+        '|'.join(map(str, parts)).encode(), usedforsecurity=False
+    ).hexdigest())
+
+
+def conditional_response(request, etag, get_response, last_modified=None,
+                         vary_on_user=False):
+    """Отвечает 304, если у клиента актуальная версия ресурса.
+
+    Иначе вызывает ``get_response`` и проставляет валидаторы, так что
+    сериализация выполняется только при изменившихся данных.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = get_response()
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    if vary_on_user:
+        patch_vary_headers(response, ('Authorization',))
+    return response
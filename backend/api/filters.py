@@ -0,0 +1,40 @@
+from django_filters import rest_framework as filters
+from base.models import Recipe
+
+from .search import search_recipes
+
+BOOLEAN_VALUES = {
+    '1': True, 'true': True, 'yes': True, 'on': True,
+    '0': False, 'false': False, 'no': False, 'off': False,
+}
+
+
+class RecipeFilter(filters.FilterSet):
+    """Фильтрация рецептов по автору, избранному и корзине покупок.
+
+    Признаки избранного и корзины берутся из аннотаций
+    ``Recipe.objects.with_user_annotations``, поэтому фильтр сводится
+    к условию ``EXISTS``/``NOT EXISTS`` без JOIN и ``DISTINCT``.
+    """
+    author = filters.NumberFilter(field_name='author_id')
+    is_favorited = filters.CharFilter(method='filter_relation')
+    is_in_shopping_cart = filters.CharFilter(method='filter_relation')
+    search = filters.CharFilter(method='filter_search')
+
+    class Meta:
+        model = Recipe
+        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'search')
+
+    def filter_relation(self, queryset, name, value):
+        """Оставляет рецепты, которые есть (1, true) или которых нет
+        (0, false) в избранном или корзине текущего пользователя.
+        Другие значения, как и запросы анонимов, не фильтруют."""
+        flag = BOOLEAN_VALUES.get(value.strip().lower())
+        if not self.request.user.is_authenticated or flag is None:
+            return queryset
+        return queryset.filter(**{name: flag})
+
+    def filter_search(self, queryset, name, value):
+        """Поиск по названию и описанию рецепта."""
+        value = value.strip()
+        return search_recipes(queryset, value) if value else queryset
@@ -0,0 +1,151 @@
+"""Поисковый индекс ингредиентов в памяти процесса.
+
+Справочник ингредиентов небольшой и почти не меняется, поэтому для
+автодополнения он целиком держится в памяти: сначала возвращаются
+совпадения по началу названия (бинарный поиск по отсортированному
+списку), затем — по подстроке (кандидаты отбираются по триграммам).
+Индекс строится при первом обращении и сбрасывается сигналами
+сохранения/удаления ``Ingredient`` и сигналом ``ingredients_imported``
+после загрузки справочника. Сброс увеличивает номер поколения в кэше,
+и процессы, индекс которых построен для другого поколения, перестраивают
+его при следующем поиске; с Redis (``REDIS_URL``) это работает для всех
+воркеров. Без общего кэша изменения из других процессов подхватываются
+не позже чем через ``INGREDIENT_INDEX_TTL`` секунд.
+"""
+import bisect
+import hashlib
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from base.models import Ingredient
+from .response_cache import bump
+
+
+def normalize(text):
+    """Приводит строку к виду для сравнения без учёта регистра и «ё»."""
+    return text.casefold().replace('ё', 'е')
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class IngredientIndex:
+    """Неизменяемый снимок справочника с индексами для поиска."""
+
+    def __init__(self, ingredients, generation=1):
+        self.generation = generation
+        self.ingredients = sorted(
+            ingredients, key=lambda item: (normalize(item.name), item.pk))
+        self.keys = [normalize(item.name) for item in self.ingredients]
+        # Версия справочника для ETag: меняется при любом изменении строк
+        digest = hashlib.md5(usedforsecurity=False)
+        for item in self.ingredients:
+            digest.update(
+                f'{item.pk}|{item.name}|{item.measurement_unit}\n'.encode())
+        self.version = digest.hexdigest()
+        self.trigram_postings = defaultdict(list)
+        for position, key in enumerate(self.keys):
+            for trigram in trigrams(key):
+                self.trigram_postings[trigram].append(position)
+
+    def search(self, query, limit):
+        """Совпадения по началу названия, затем по подстроке."""
+        query = normalize(query.strip())
+        if not query:
+            return self.ingredients[:limit]
+
+        start = bisect.bisect_left(self.keys, query)
+        prefix_positions = []
+        for position in range(start, len(self.keys)):
+            if len(prefix_positions) >= limit:
+                break
+            if not self.keys[position].startswith(query):
+                break
+            prefix_positions.append(position)
+
+        result = [self.ingredients[pos] for pos in prefix_positions]
+        if len(result) >= limit:
+            return result
+
+        seen = set(prefix_positions)
+        for position in self._substring_candidates(query):
+            if position in seen or query not in self.keys[position]:
+                continue
+            result.append(self.ingredients[position])
+            if len(result) >= limit:
+                break
+        return result
+
+    def _substring_candidates(self, query):
+        """Позиции, содержащие все триграммы запроса, по порядку."""
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            # Для запросов короче трёх символов проверяется весь список
+            return range(len(self.keys))
+        postings = sorted(
+            (self.trigram_postings.get(trigram, ())
+             for trigram in query_trigrams),
+            key=len,
+        )
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return sorted(candidates)
+
+
+GENERATION_KEY = 'ingredients:index-generation'
+
+_lock = threading.Lock()
+_index = None
+_built_at = 0.0
+
+
+def _is_fresh(index, generation):
+    return index is not None and index.generation == generation and (
+        time.monotonic() - _built_at < settings.INGREDIENT_INDEX_TTL)
+
+
+def get_index():
+    """Возвращает актуальный индекс, перестраивая его при необходимости."""
+    global _index, _built_at
+    generation = cache.get(GENERATION_KEY, 1)
+    if _is_fresh(_index, generation):
+        return _index
+    with _lock:
+        if not _is_fresh(_index, generation):
+            # Поколение прочитано до выборки: сброс во время построения
+            # вызовет ещё одно перестроение, а не потерю изменений
+            _index = IngredientIndex(Ingredient.objects.all(), generation)
+            _built_at = time.monotonic()
+        return _index
+
+
+async def aget_index():
+    """``get_index`` для асинхронных представлений: актуальный индекс
+    отдаётся без перехода в поток."""
+    index = _index
+    if _is_fresh(index, await cache.aget(GENERATION_KEY, 1)):
+        return index
+    return await sync_to_async(get_index)()
+
+
+def invalidate():
+    """Сбрасывает индекс во всех процессах, использующих общий кэш; он
+    будет построен заново при следующем поиске."""
+    global _index
+    _index = None
+    bump(GENERATION_KEY)
+
+
+def search(query, limit=None):
+    """Ищет ингредиенты по названию."""
+    return get_index().search(
+        query, limit or settings.INGREDIENT_SEARCH_LIMIT)
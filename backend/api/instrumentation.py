@@ -0,0 +1,243 @@
+"""Метрики запросов: число и время SQL-запросов, время сериализации
+и общая задержка.
+
+Значения отдаются клиенту в заголовке ``Server-Timing``, пишутся в лог
+``api.requests`` одной JSON-строкой на запрос (при уровне INFO, см.
+``REQUEST_LOG_LEVEL``) и накапливаются
+в гистограммах по маршрутам. Гистограммы хранятся в памяти процесса,
+так что у каждого воркера gunicorn своя статистика.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.db import connections
+
+from .metrics import observe_request
+
+logger = logging.getLogger('api.requests')
+
+# Верхние границы корзин гистограммы задержек, мс
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Сколько SQL-запросов запоминать для лога медленных запросов
+MAX_LOGGED_QUERIES = 200
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счётчики одного запроса; передаётся в ``execute_wrapper``."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.sql = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            if len(self.sql) < MAX_LOGGED_QUERIES:
+                self.sql.append(sql)
+
+    def attach(self):
+        """Подключает счётчик ко всем соединениям с БД текущего потока."""
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+
+    def detach(self):
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+    @contextmanager
+    def capture(self):
+        self.attach()
+        try:
+            yield
+        finally:
+            self.detach()
+
+    def as_dict(self):
+        total = time.perf_counter() - self.started
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 3),
+            'serializer_ms': round(self.serializer_time * 1000, 3),
+            'total_ms': round(total * 1000, 3),
+        }
+
+
+@contextmanager
+def measure_serializer():
+    """Учитывает время сериализации; вложенные вызовы не суммируются."""
+    metrics = _current.get()
+    if metrics is None or metrics.serializer_depth:
+        yield
+        return
+    metrics.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_depth -= 1
+        metrics.serializer_time += time.perf_counter() - started
+
+
+class RouteStats:
+    """Гистограммы задержек и суммы счётчиков по маршрутам."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def add(self, route, values):
+        with self._lock:
+            stats = self._routes.setdefault(route, {
+                'count': 0,
+                'queries': 0,
+                'db_ms': 0.0,
+                'serializer_ms': 0.0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+            })
+            stats['count'] += 1
+            for key in ('queries', 'db_ms', 'serializer_ms', 'total_ms'):
+                stats[key] += values[key]
+            stats['max_ms'] = max(stats['max_ms'], values['total_ms'])
+            stats['buckets'][
+                bisect_left(LATENCY_BUCKETS, values['total_ms'])] += 1
+
+    def snapshot(self):
+        with self._lock:
+            routes = {route: dict(stats, buckets=list(stats['buckets']))
+                      for route, stats in self._routes.items()}
+        labels = [f'le_{bound}' for bound in LATENCY_BUCKETS] + ['le_inf']
+        return {
+            route: {
+                'count': stats['count'],
+                'avg_queries': round(stats['queries'] / stats['count'], 2),
+                'avg_db_ms': round(stats['db_ms'] / stats['count'], 3),
+                'avg_serializer_ms': round(
+                    stats['serializer_ms'] / stats['count'], 3),
+                'avg_total_ms': round(stats['total_ms'] / stats['count'], 3),
+                'max_ms': round(stats['max_ms'], 3),
+                'histogram_ms': dict(zip(labels, stats['buckets'])),
+            }
+            for route, stats in sorted(routes.items())
+        }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_stats = RouteStats()
+
+
+def route_name(request):
+    """Метка маршрута: метод и имя URL (``GET recipe-list``)."""
+    match = getattr(request, 'resolver_match', None)
+    name = match.view_name if match and match.view_name else 'unresolved'
+    return f'{request.method} {name}'
+
+
+class InstrumentationMiddleware:
+    """Замер числа SQL-запросов и задержки каждого запроса.
+
+    Работает и под WSGI, и под ASGI, не переводя асинхронные
+    представления в синхронный режим.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with metrics.capture():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        # Соединения с БД принадлежат потоку, в котором sync_to_async
+        # выполняет ORM-запросы этого запроса, поэтому счётчик
+        # подключается в том же потоке.
+        await sync_to_async(metrics.attach)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(metrics.detach)()
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        values = metrics.as_dict()
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={values["db_ms"]};desc="{values["queries"]} queries"',
+            f'serializer;dur={values["serializer_ms"]}',
+            f'total;dur={values["total_ms"]}',
+        ))
+        if response.streaming:
+            # Запросы потокового ответа выполняются при отдаче тела,
+            # поэтому запись в лог откладывается до его завершения.
+            response.streaming_content = self.stream(
+                response.streaming_content, request, response, metrics)
+        else:
+            self.record(request, response, metrics)
+        return response
+
+    def stream(self, content, request, response, metrics):
+        iterator = iter(content)
+        while True:
+            with metrics.capture():
+                chunk = next(iterator, None)
+            if chunk is None:
+                break
+            yield chunk
+        self.record(request, response, metrics)
+
+    @staticmethod
+    def record(request, response, metrics):
+        route = route_name(request)
+        values = metrics.as_dict()
+        route_stats.add(route, values)
+        observe_request(request, response, values)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'route': route,
+                'path': request.path,
+                'status': response.status_code,
+                **values,
+            }, ensure_ascii=False))
+        threshold = settings.QUERY_COUNT_LOG_THRESHOLD
+        if threshold and metrics.queries > threshold:
+            logger.warning(
+                'Запрос %s %s выполнил %d SQL-запросов (порог %d):\n%s',
+                request.method, request.path, metrics.queries, threshold,
+                '\n'.join(metrics.sql))
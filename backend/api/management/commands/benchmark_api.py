@@ -0,0 +1,155 @@
+import json
+import math
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework.authtoken.models import Token
+from base.models import Favorite, Recipe, ShoppingCart, Subscription
+
+User = get_user_model()
+
+
+def percentile(values, fraction):
+    """Процентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Замер задержек и числа SQL-запросов основных эндпоинтов API '
+            'с выводом JSON-отчёта')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=30,
+                            help='Число замеров каждого эндпоинта')
+        parser.add_argument(
+            '--email',
+            help='Пользователь, от имени которого выполняются запросы; '
+                 'по умолчанию — с наибольшим числом подписок')
+        parser.add_argument('--host', default='localhost',
+                            help='Значение заголовка Host')
+        parser.add_argument('--output', default='-',
+                            help='Файл для JSON-отчёта; «-» — стандартный '
+                                 'вывод')
+        parser.add_argument(
+            '--compare',
+            help='Предыдущий отчёт для сравнения медиан и числа запросов')
+        parser.add_argument(
+            '--ingredient-query', action='append', dest='ingredient_queries',
+            help='Поисковые строки для /api/ingredients/?name=')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным.')
+        user = self.get_user(options['email'])
+        recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+        if recipe is None:
+            raise CommandError(
+                'Нет рецептов. Выполните сначала seed_benchmark_data.')
+        token, _ = Token.objects.get_or_create(user=user)
+        client = Client(HTTP_HOST=options['host'],
+                        HTTP_AUTHORIZATION=f'Token {token.key}')
+        anonymous = Client(HTTP_HOST=options['host'])
+
+        scenarios = [
+            ('recipes_list', client, '/api/recipes/'),
+            ('recipes_list_anonymous', anonymous, '/api/recipes/'),
+            ('recipes_list_cursor', client, '/api/recipes/?cursor='),
+            ('recipe_detail', client, f'/api/recipes/{recipe.pk}/'),
+            ('recipes_feed', client, '/api/recipes/feed/'),
+            ('subscriptions', client,
+             '/api/users/subscriptions/?recipes_limit=3'),
+            ('download_shopping_cart', client,
+             '/api/recipes/download_shopping_cart/'),
+        ]
+        for query in options['ingredient_queries'] or ['сыр', 'мо']:
+            scenarios.append((
+                f'ingredients_search[{query}]', client,
+                f'/api/ingredients/?name={query}'))
+
+        report = {
+            'generated_at': now().isoformat(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'user': user.email,
+            'data': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'favorites': Favorite.objects.count(),
+                'shopping_carts': ShoppingCart.objects.count(),
+                'subscriptions': Subscription.objects.count(),
+            },
+            'endpoints': {
+                name: self.measure(client, path, options['repeat'])
+                for name, client, path in scenarios
+            },
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2,
+                            sort_keys=True)
+        if options['output'] == '-':
+            self.stdout.write(output)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        if options['compare']:
+            self.compare(options['compare'], report)
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+        else:
+            user = (
+                User.objects.annotate(follows=Count('subscribers'))
+                .order_by('-follows', 'id').first()
+            )
+        if user is None:
+            raise CommandError('Пользователь для замеров не найден.')
+        return user
+
+    @staticmethod
+    def measure(client, path, repeat):
+        """Прогрев и ``repeat`` замеров одного запроса."""
+        client.get(path)
+        timings = []
+        queries = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(path)
+                if response.streaming:
+                    # Запросы потокового ответа выполняются при чтении
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+        return {
+            'path': path,
+            'status': response.status_code,
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': max(queries),
+        }
+
+    def compare(self, path, report):
+        try:
+            with open(path, encoding='utf-8') as file:
+                previous = json.load(file)['endpoints']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось прочитать отчёт "{path}": {error}')
+        for name, current in report['endpoints'].items():
+            before = previous.get(name)
+            if before is None:
+                continue
+            change = (current['p50_ms'] - before['p50_ms']) / max(
+                before['p50_ms'], 0.001) * 100
+            self.stderr.write(
+                f'{name}: p50 {before["p50_ms"]} -> {current["p50_ms"]} мс '
+                f'({change:+.1f}%), запросов {before["queries"]} -> '
+                f'{current["queries"]}')
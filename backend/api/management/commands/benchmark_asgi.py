@@ -0,0 +1,105 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from base.models import Recipe
+from .benchmark_api import percentile
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочное сравнение запущенных бэкендов, например gunicorn '
+            'в режиме WSGI и с GUNICORN_ASGI=True: пропускная способность '
+            'и задержки анонимного чтения рецептов и ингредиентов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', action='append', dest='urls', required=True,
+            help='Адрес бэкенда, например http://127.0.0.1:8000; '
+                 'указывается несколько раз для сравнения')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Путь запроса; по умолчанию список, карточка рецепта '
+                 'и поиск ингредиентов')
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Число одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Длительность замера каждого пути, с')
+        parser.add_argument('--timeout', type=float, default=10,
+                            help='Таймаут одного запроса, с')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['duration'] <= 0:
+            raise CommandError('--concurrency и --duration должны быть '
+                               'положительными.')
+        paths = options['paths'] or self.default_paths()
+        for url in options['urls']:
+            for path in paths:
+                target = url.rstrip('/') + quote(path, safe='/?=&%')
+                # Прогрев: кэш ответов и индекс ингредиентов воркера
+                self.request(target, options['timeout'])
+                result = self.measure(
+                    target, options['concurrency'], options['duration'],
+                    options['timeout'])
+                self.stdout.write(
+                    f'{url} {path}: {result["rps"]:.0f} запросов/с, '
+                    f'p50 {result["p50_ms"]:.1f} мс, '
+                    f'p95 {result["p95_ms"]:.1f} мс, '
+                    f'ошибок {result["errors"]}')
+
+    @staticmethod
+    def default_paths():
+        recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+        if recipe is None:
+            raise CommandError(
+                'Нет рецептов. Выполните сначала seed_benchmark_data.')
+        return ['/api/recipes/', f'/api/recipes/{recipe.pk}/',
+                '/api/ingredients/?name=мо']
+
+    @staticmethod
+    def request(url, timeout):
+        try:
+            with urlopen(Request(url, headers={
+                    'Accept': 'application/json'}), timeout=timeout) as reply:
+                reply.read()
+                return reply.status == 200
+        except (HTTPError, URLError, OSError):
+            return False
+
+    def measure(self, url, concurrency, duration, timeout):
+        """Клиенты в ``concurrency`` потоках шлют запросы без пауз
+        в течение ``duration`` секунд."""
+        timings = []
+        errors = 0
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def client():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                ok = self.request(url, timeout)
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    if ok:
+                        timings.append(elapsed)
+                    else:
+                        errors += 1
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(concurrency) as executor:
+            for _ in range(concurrency):
+                executor.submit(client)
+        elapsed = time.monotonic() - started
+        if not timings:
+            raise CommandError(f'Нет успешных ответов от {url}.')
+        return {
+            'rps': len(timings) / elapsed,
+            'p50_ms': statistics.median(timings),
+            'p95_ms': percentile(timings, 0.95),
+            'errors': errors,
+        }
@@ -0,0 +1,79 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from base.models import Recipe
+
+from .benchmark_api import percentile
+
+
+class Command(BaseCommand):
+    help = ('Сравнение задержки запросов с новым соединением с БД '
+            'на каждый запрос и с постоянными соединениями')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Число запросов в каждом режиме')
+        parser.add_argument('--host', default='localhost',
+                            help='Значение заголовка Host')
+        parser.add_argument(
+            '--conn-max-age', type=int,
+            help='CONN_MAX_AGE для режима постоянных соединений; '
+                 'по умолчанию — из настроек, но не меньше 60')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должен быть положительным.')
+        recipe_id = Recipe.objects.values_list('id', flat=True).first()
+        if recipe_id is None:
+            raise CommandError(
+                'Нет рецептов. Выполните сначала seed_benchmark_data.')
+        persistent = options['conn_max_age'] or max(
+            connection.settings_dict['CONN_MAX_AGE'] or 0, 60)
+        client = Client(HTTP_HOST=options['host'])
+        path = f'/s/{recipe_id}'
+
+        original = connection.settings_dict['CONN_MAX_AGE']
+        try:
+            for title, max_age in (('новое соединение', 0),
+                                   ('постоянное соединение', persistent)):
+                connection.settings_dict['CONN_MAX_AGE'] = max_age
+                connection.close()
+                self.report(title, *self.measure(
+                    client, path, options['requests']))
+        finally:
+            connection.settings_dict['CONN_MAX_AGE'] = original
+            connection.close()
+
+    @staticmethod
+    def measure(client, path, count):
+        """Задержки запросов и число открытых за замер соединений."""
+        opened = []
+
+        def on_connect(**kwargs):
+            opened.append(kwargs['connection'].alias)
+
+        connection_created.connect(on_connect)
+        try:
+            timings = []
+            for _ in range(count):
+                started = time.perf_counter()
+                # Тестовый клиент отключает close_old_connections от
+                # сигналов начала и конца запроса; без этого соединение
+                # не закрывалось бы ни в одном режиме
+                close_old_connections()
+                client.get(path)
+                close_old_connections()
+                timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection_created.disconnect(on_connect)
+        return timings, len(opened)
+
+    def report(self, title, timings, opened):
+        self.stdout.write(
+            f'{title}: p50 {statistics.median(timings):.3f} мс, '
+            f'p95 {percentile(timings, 0.95):.3f} мс, '
+            f'открыто соединений: {opened}')
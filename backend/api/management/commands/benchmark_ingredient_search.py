@@ -0,0 +1,49 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from base.models import Ingredient
+
+from api import ingredient_index
+
+
+class Command(BaseCommand):
+    help = 'Сравнение поиска ингредиентов по индексу в памяти и через ORM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Число повторов каждого запроса')
+        parser.add_argument('queries', nargs='*',
+                            default=['а', 'мо', 'сыр', 'масло', 'ово'])
+
+    def handle(self, *args, **options):
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        started = time.perf_counter()
+        ingredient_index.invalidate()
+        ingredient_index.get_index()
+        self.stdout.write(
+            f'Построение индекса: {self.ms(time.perf_counter() - started)}')
+
+        for query in options['queries']:
+            orm = self.measure(options['repeat'], lambda: list(
+                Ingredient.objects.filter(name__icontains=query)
+                .order_by('name')[:limit]))
+            memory = self.measure(options['repeat'], lambda: (
+                ingredient_index.search(query)))
+            self.stdout.write(
+                f'{query!r}: ORM {self.ms(orm)}, '
+                f'индекс {self.ms(memory)} (медиана)')
+
+    @staticmethod
+    def measure(repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
+
+    @staticmethod
+    def ms(seconds):
+        return f'{seconds * 1000:.3f} мс'
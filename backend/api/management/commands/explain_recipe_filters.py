@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from base.models import Recipe
+from api.filters import BOOLEAN_VALUES, RecipeFilter
+from api.views import RecipeViewSet
+
+User = get_user_model()
+
+# Параметры запроса к /api/recipes/ для сравнения планов
+CASES = (
+    {},
+    {'is_favorited': '1'},
+    {'is_in_shopping_cart': '1'},
+    {'is_favorited': '1', 'is_in_shopping_cart': '1'},
+    {'is_favorited': '0'},
+)
+EXISTS_HEADER = '-- EXISTS (текущий фильтр)'
+DISTINCT_HEADER = '-- JOIN + DISTINCT (прежний фильтр)'
+
+
+class Command(BaseCommand):
+    help = ('Планы выполнения (EXPLAIN) страницы списка рецептов с '
+            'фильтрами is_favorited/is_in_shopping_cart и без них: '
+            'текущий фильтр через EXISTS и прежний через JOIN и DISTINCT; '
+            'данные — от seed_benchmark_data')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email',
+            help='Пользователь, от имени которого строятся запросы; '
+                 'по умолчанию — с наибольшим числом избранного')
+        parser.add_argument('--limit', type=int, default=6,
+                            help='Размер страницы')
+        parser.add_argument('--no-analyze', action='store_true',
+                            help='Не выполнять запросы (EXPLAIN без '
+                                 'ANALYZE в PostgreSQL)')
+
+    def handle(self, *args, **options):
+        if options['limit'] < 1:
+            raise CommandError('--limit должен быть положительным.')
+        user = self.get_user(options['email'])
+        self.stdout.write(f'Пользователь: {user.email}')
+        explain_options = {}
+        if connection.vendor == 'postgresql':
+            explain_options = {'analyze': not options['no_analyze'],
+                               'buffers': not options['no_analyze']}
+        factory = RequestFactory()
+        for params in CASES:
+            request = factory.get('/api/recipes/', params)
+            request.user = user
+            # Тот же запрос, что строит RecipeViewSet.list
+            queryset = RecipeFilter(
+                params,
+                Recipe.objects.with_user_annotations(user).order_by(
+                    *RecipeViewSet.cursor_ordering),
+                request=request,
+            ).qs[:options['limit']]
+            self.stdout.write(f'\n{request.get_full_path()}')
+            self.stdout.write(EXISTS_HEADER)
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write(DISTINCT_HEADER)
+            self.stdout.write(self.distinct_queryset(user, params)[
+                :options['limit']].explain(**explain_options))
+
+    @staticmethod
+    def distinct_queryset(user, params):
+        """Прежний вариант фильтра: JOIN со связями и DISTINCT."""
+        queryset = Recipe.objects.with_user_annotations(user).order_by(
+            *RecipeViewSet.cursor_ordering)
+        for param, lookup in (('is_favorited', 'favorite__user'),
+                              ('is_in_shopping_cart', 'shoppingcart__user')):
+            flag = BOOLEAN_VALUES.get(params.get(param, '').lower())
+            if flag is True:
+                queryset = queryset.filter(**{lookup: user})
+            elif flag is False:
+                queryset = queryset.exclude(**{lookup: user})
+        return queryset.distinct()
+
+    @staticmethod
+    def get_user(email):
+        if email:
+            user = User.objects.filter(email=email).first()
+        else:
+            user = (
+                User.objects.annotate(favorites=Count('favorite'))
+                .order_by('-favorites', 'id').first()
+            )
+        if user is None:
+            raise CommandError('Пользователь не найден. Выполните сначала '
+                               'seed_benchmark_data.')
+        return user
@@ -0,0 +1,127 @@
+"""Метрики в формате Prometheus.
+
+Если задана переменная окружения ``PROMETHEUS_MULTIPROC_DIR``,
+prometheus_client хранит значения в файлах этого каталога, и эндпоинт
+``/metrics`` суммирует их по всем воркерам gunicorn (см. gunicorn.conf.py).
+"""
+import os
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+
+REQUESTS = Counter(
+    'foodgram_http_requests_total',
+    'Число HTTP-запросов по представлениям и действиям DRF',
+    ['view', 'action', 'method', 'status'])
+REQUEST_LATENCY = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Длительность обработки HTTP-запроса',
+    ['view', 'action', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+REQUEST_QUERIES = Histogram(
+    'foodgram_db_queries_per_request',
+    'Число SQL-запросов на один HTTP-запрос',
+    ['view', 'action'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250))
+REQUEST_DB_TIME = Histogram(
+    'foodgram_db_time_per_request_seconds',
+    'Суммарное время SQL-запросов одного HTTP-запроса',
+    ['view', 'action'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+
+RECIPE_RELATIONS = Counter(
+    'foodgram_recipe_relation_operations_total',
+    'Добавления и удаления рецептов в избранном и корзине',
+    ['relation', 'operation'])
+SUBSCRIPTIONS = Counter(
+    'foodgram_subscription_operations_total',
+    'Подписки и отписки',
+    ['operation'])
+SHOPPING_LIST_DOWNLOADS = Counter(
+    'foodgram_shopping_list_downloads_total',
+    'Скачивания списка покупок',
+    ['format'])
+IMAGE_UPLOAD_BYTES = Histogram(
+    'foodgram_image_upload_bytes',
+    'Размер загруженных изображений',
+    ['field'],
+    buckets=(16 * 1024, 64 * 1024, 256 * 1024, 512 * 1024, 1024 ** 2,
+             2 * 1024 ** 2, 5 * 1024 ** 2, 10 * 1024 ** 2))
+AUTH_FAILURES = Counter(
+    'foodgram_auth_failures_total',
+    'Неудачные попытки входа')
+# Доля попаданий считается в Prometheus:
+# rate(...{result="hit"}) / rate(...) — счётчик суммируется по воркерам
+RESPONSE_CACHE_LOOKUPS = Counter(
+    'foodgram_response_cache_lookups_total',
+    'Обращения к кэшу ответов рецептов',
+    ['result'])
+
+
+def view_labels(request):
+    """Имя класса представления и действие DRF (``favorite``, ``list``)."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved', ''
+    func = match.func
+    view = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    actions = getattr(func, 'actions', None) or {}
+    return (
+        view.__name__ if view else match.view_name or func.__name__,
+        actions.get(request.method.lower(), ''),
+    )
+
+
+def observe_request(request, response, values):
+    """Учитывает запрос; ``values`` — метрики из api.instrumentation."""
+    view, action = view_labels(request)
+    REQUESTS.labels(view, action, request.method,
+                    response.status_code).inc()
+    REQUEST_LATENCY.labels(view, action, request.method).observe(
+        values['total_ms'] / 1000)
+    REQUEST_QUERIES.labels(view, action).observe(values['queries'])
+    REQUEST_DB_TIME.labels(view, action).observe(values['db_ms'] / 1000)
+
+
+class StateCollector:
+    """Метрики, снимаемые в момент опроса: соединения с БД."""
+
+    def collect(self):
+        if connection.vendor == 'postgresql':
+            connections = GaugeMetricFamily(
+                'foodgram_db_connections',
+                'Соединения с базой данных по состояниям',
+                labels=['state'])
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT coalesce(state, %s), count(*) '
+                    'FROM pg_stat_activity WHERE datname = current_database() '
+                    'GROUP BY 1', ['unknown'])
+                for state, count in cursor.fetchall():
+                    connections.add_metric([state], count)
+            yield connections
+
+
+_state_registry = CollectorRegistry()
+_state_registry.register(StateCollector())
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus."""
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(
+        generate_latest(registry) + generate_latest(_state_registry),
+        content_type=CONTENT_TYPE_LATEST)
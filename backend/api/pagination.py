@@ -0,0 +1,149 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по ключу из всех полей порядка.
+
+    Курсор хранит значения полей порядка крайней строки страницы, и
+    соседняя страница выбирается условием ``(a, b) < (a0, b0)``,
+    развёрнутым в ``Q(a__lt=a0) | Q(a=a0, b__lt=b0)``. Совпадающие
+    значения первого поля и глубина листания не требуют OFFSET. Поля
+    порядка не должны содержать NULL, а их набор — повторяться.
+    """
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self, ordering, cursor_query_param, page_size):
+        self.ordering = tuple(ordering)
+        self.cursor_query_param = cursor_query_param
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.key, reverse = self.decode_cursor(request)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering)
+        if self.key is not None:
+            try:
+                queryset = queryset.filter(self.after(ordering, self.key))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = self.key is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.key is not None
+        self.page = rows
+        return rows
+
+    @staticmethod
+    def after(ordering, key):
+        """Условие «строка идёт после ключа ``key`` в порядке
+        ``ordering``»."""
+        condition = None
+        for field, value in reversed(tuple(zip(ordering, key))):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            strict = Q(**{f'{name}__{lookup}': value})
+            condition = strict if condition is None else (
+                strict | Q(**{name: value}) & condition)
+        # Нестрогая граница по первому полю позволяет начать
+        # просмотр индекса сразу с нужного места
+        first = ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': key[0]}) & condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            key, reverse = cursor['k'], bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(key, list) or len(key) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return key, reverse
+
+    def encode_cursor(self, row, reverse):
+        key = []
+        for field in self.ordering:
+            value = getattr(row, field.lstrip('-'))
+            key.append(value.isoformat() if isinstance(value, datetime)
+                       else value)
+        cursor = {'k': key, 'r': 1} if reverse else {'k': key}
+        return replace_query_param(
+            self.base_url, self.cursor_query_param,
+            base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode())
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Пустая страница при листании назад: следующая начинается
+            # с той строки, от которой листали
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class CursorOrPageNumberPagination(PageNumberPagination):
+    """Постраничная пагинация с размером страницы из параметра ``limit``.
+
+    Если представление задаёт ``cursor_ordering``, а в запросе передан
+    параметр ``cursor`` (в том числе пустой — для первой страницы),
+    используется курсорная пагинация по этому порядку (см.
+    ``KeysetPagination``): она не считает ``COUNT(*)`` и не делает
+    OFFSET-сканирования на дальних страницах. Представления
+    с ``cursor_required = True`` всегда листаются курсором.
+    """
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering and (
+                getattr(view, 'cursor_required', False)
+                or self.cursor_query_param in request.query_params):
+            self.cursor_pagination = KeysetPagination(
+                ordering, self.cursor_query_param,
+                self.get_page_size(request))
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view)
+        self.cursor_pagination = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
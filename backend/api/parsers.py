@@ -0,0 +1,303 @@
+"""Потоковый разбор JSON с изображениями в base64.
+
+Обычный ``JSONParser`` держит в памяти одновременно тело запроса,
+строку base64 и декодированный файл. Здесь тело читается порциями:
+значения полей-изображений верхнего уровня декодируются на лету
+во временный файл, а остальной JSON (без них) разбирается как обычно.
+Превышение допустимых размеров обнаруживается до чтения всего тела.
+"""
+import base64
+import binascii
+import json
+import re
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.template.defaultfilters import filesizeformat
+from rest_framework import permissions, status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import DataAndFiles, JSONParser
+
+QUOTE = ord('"')
+BACKSLASH = ord('\\')
+WHITESPACE = b' \t\r\n'
+STRING_SPECIAL = re.compile(rb'["\\]')
+# Наибольшая длина заголовка data:<тип>;base64,
+MAX_HEADER_LENGTH = 256
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой размер запроса.'
+    default_code = 'payload_too_large'
+
+
+class Base64FileWriter:
+    """Декодирует строку base64 (с заголовком data:...) во временный файл."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.header = bytearray()
+        self.header_done = False
+        self.content_type = None
+        self.pending = b''
+        self.carry = b''
+        self.size = 0
+        self.file = TemporaryUploadedFile(
+            name='upload', content_type=None, size=0, charset=None)
+
+    def feed(self, segment):
+        if not self.header_done:
+            self.header += segment
+            if not self._parse_header(final=False):
+                return
+            segment, self.header = bytes(self.header), None
+        data = self.carry + segment
+        self.carry = b''
+        if data.endswith(b'\\'):
+            data, self.carry = data[:-1], b'\\'
+        # В JSON символ «/» может быть экранирован
+        data = data.replace(b'\\/', b'/')
+        if b'\\' in data:
+            raise ParseError('Некорректная строка base64.')
+        data = self.pending + data
+        aligned = len(data) // 4 * 4
+        self.pending = data[aligned:]
+        self._write(data[:aligned])
+
+    def finish(self):
+        """Дописывает остаток и возвращает файл (None для пустой строки)."""
+        if not self.header_done:
+            self._parse_header(final=True)
+            segment, self.header = bytes(self.header), None
+            self.feed(segment)
+        if self.carry:
+            raise ParseError('Некорректная строка base64.')
+        if self.pending:
+            self._write(self.pending + b'=' * (-len(self.pending) % 4))
+        if not self.size:
+            self.file.close()
+            return None
+        self.file.seek(0)
+        self.file.size = self.size
+        self.file.content_type = self.content_type
+        return self.file
+
+    def _parse_header(self, final):
+        """Отделяет заголовок data:...;base64, если он есть.
+
+        Возвращает False, если для решения нужно больше данных.
+        """
+        header = bytes(self.header)
+        if not b'data:'.startswith(header[:5]) or (
+                len(header) < 5 and final):
+            # Строка base64 без заголовка
+            self.header_done = True
+            return True
+        if len(header) < 5:
+            return False
+        marker = header.find(b';base64,')
+        if marker != -1:
+            self.content_type = header[5:marker].decode('ascii', 'replace')
+            self.header = bytearray(header[marker + len(b';base64,'):])
+            self.header_done = True
+            return True
+        if final or len(header) > MAX_HEADER_LENGTH:
+            raise ParseError('Некорректная строка base64.')
+        return False
+
+    def _write(self, data):
+        if not data:
+            return
+        try:
+            decoded = base64.b64decode(data, validate=True)
+        except (binascii.Error, ValueError):
+            raise ParseError('Некорректная строка base64.')
+        self.size += len(decoded)
+        if self.size > self.max_size:
+            raise PayloadTooLarge(
+                'Размер изображения превышает '
+                f'{filesizeformat(self.max_size)}.')
+        self.file.write(decoded)
+
+
+class JSONFileExtractor:
+    """Копирует JSON, вырезая значения полей-файлов верхнего уровня.
+
+    Вместо вырезанных строк в JSON подставляется ``null``, а сами
+    значения декодируются ``Base64FileWriter``.
+    """
+
+    def __init__(self, file_fields, max_file_size, max_json_size):
+        self.file_fields = {field.encode() for field in file_fields}
+        self.max_file_size = max_file_size
+        self.max_json_size = max_json_size
+        self.json = bytearray()
+        self.files = {}
+        self.depth = 0
+        self.top_is_object = False
+        self.in_string = False
+        self.escape = False
+        self.expect_key = False
+        self.key = None
+        self.last_key = None
+        self.file_key = None
+        self.writer = None
+
+    def feed(self, chunk):
+        position = 0
+        while position < len(chunk):
+            if self.writer is not None:
+                position = self._feed_file(chunk, position)
+            elif self.in_string:
+                position = self._feed_string(chunk, position)
+            else:
+                self._feed_structure(chunk[position])
+                position += 1
+        if len(self.json) > self.max_json_size:
+            raise PayloadTooLarge()
+
+    def finish(self):
+        if self.writer is not None or self.in_string:
+            raise ParseError('JSON parse error - unterminated string')
+        return bytes(self.json), self.files
+
+    def close(self):
+        """Удаляет временные файлы, если разбор прерван ошибкой."""
+        if self.writer is not None:
+            self.writer.file.close()
+        for file in self.files.values():
+            if file is not None:
+                file.close()
+
+    def _feed_string(self, chunk, position):
+        if self.escape:
+            self.escape = False
+            self._append_string(chunk[position:position + 1])
+            return position + 1
+        match = STRING_SPECIAL.search(chunk, position)
+        end = match.start() if match else len(chunk)
+        self._append_string(chunk[position:end])
+        if not match:
+            return end
+        if chunk[end] == BACKSLASH:
+            self.escape = True
+            self._append_string(b'\\')
+        else:
+            self.in_string = False
+            self.json.append(QUOTE)
+            if self.key is not None:
+                self.last_key, self.key = bytes(self.key), None
+        return end + 1
+
+    def _append_string(self, data):
+        self.json += data
+        if self.key is not None:
+            self.key += data
+
+    def _feed_structure(self, byte):
+        if byte == QUOTE and self.file_key is not None:
+            # Начало значения поля-файла: пишем его во временный файл
+            self.writer = Base64FileWriter(self.max_file_size)
+            self.json += b'null'
+            return
+        if byte in WHITESPACE:
+            self.json.append(byte)
+            return
+        if byte == QUOTE:
+            self.in_string = True
+            if self.depth == 1 and self.expect_key:
+                self.key = bytearray()
+                self.expect_key = False
+        elif byte in b'{[':
+            self.depth += 1
+            if self.depth == 1:
+                self.top_is_object = byte == ord('{')
+                self.expect_key = self.top_is_object
+        elif byte in b'}]':
+            self.depth -= 1
+        elif byte == ord(','):
+            self.expect_key = self.depth == 1 and self.top_is_object
+        elif byte == ord(':'):
+            if self.depth == 1 and self.last_key in self.file_fields:
+                self.file_key = self.last_key.decode()
+                self.json.append(byte)
+                return
+        self.file_key = None
+        self.json.append(byte)
+
+    def _feed_file(self, chunk, position):
+        end = chunk.find(b'"', position)
+        self.writer.feed(chunk[position:end if end != -1 else len(chunk)])
+        if end == -1:
+            return len(chunk)
+        self.files[self.file_key] = self.writer.finish()
+        self.writer = self.file_key = None
+        return end + 1
+
+
+class StreamingBase64JSONParser(JSONParser):
+    """JSON-парсер с потоковым декодированием изображений в base64."""
+    file_fields = ('image', 'avatar')
+    chunk_size = 64 * 1024
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        max_file_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        max_json_size = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        request = (parser_context or {}).get('request')
+        content_length = int(
+            request.META.get('CONTENT_LENGTH') or 0) if request else 0
+        # base64 длиннее исходных данных в 4/3 раза
+        if content_length > max_file_size * 4 // 3 + max_json_size:
+            raise PayloadTooLarge()
+
+        extractor = JSONFileExtractor(
+            self.file_fields, max_file_size, max_json_size)
+        try:
+            while True:
+                chunk = stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                extractor.feed(chunk)
+            raw_json, files = extractor.finish()
+            data = json.loads(raw_json.decode(
+                (parser_context or {}).get('encoding',
+                                           settings.DEFAULT_CHARSET)))
+        except ValueError as exc:
+            extractor.close()
+            raise ParseError(f'JSON parse error - {exc}')
+        except Exception:
+            extractor.close()
+            raise
+        uploaded = {}
+        for field, file in files.items():
+            data[field] = file if file is not None else ''
+            if file is not None:
+                uploaded[field] = file
+        # Файлы доступны и как request.FILES. Это обычный словарь:
+        # DRF объединяет файлы с данными через dict.update, и значения
+        # MultiValueDict попали бы в данные списками. Временный файл
+        # после сохранения модели перемещается в хранилище, иначе
+        # удаляется при закрытии объекта файла.
+        return DataAndFiles(data, uploaded)
+
+
+class CloseUploadedFilesMixin:
+    """Закрывает временные файлы, извлечённые парсером, когда ответ
+    готов.
+
+    Файлы multipart-загрузок закрывает сам Django, а файлы из JSON
+    он не видит; без закрытия временный файл удалялся бы только при
+    сборке мусора.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in permissions.SAFE_METHODS:
+            try:
+                files = request.FILES
+            except APIException:
+                # Тело не удалось разобрать, файлов нет
+                files = {}
+            for file in files.values():
+                file.close()
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,103 @@
+"""Кэш ответов на анонимные запросы к рецептам.
+
+Ключи версионируются: при изменении рецепта, его ингредиентов, автора
+или справочника ингредиентов сигналы (``api/signals.py``) увеличивают
+соответствующий номер версии, и старые записи просто перестают
+использоваться, истекая по таймауту.
+
+По умолчанию используется локальный кэш процесса, поэтому сброс
+действует только в том воркере, где произошло изменение, а в остальных
+записи живут не дольше ``RECIPE_CACHE_TIMEOUT``. С Redis (``REDIS_URL``)
+версии общие для всех воркеров.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import RESPONSE_CACHE_LOOKUPS
+
+PREFIX = 'recipes'
+GLOBAL_VERSION = f'{PREFIX}:version'
+LIST_VERSION = f'{PREFIX}:list-version'
+
+
+def recipe_version_key(recipe_id):
+    return f'{PREFIX}:recipe-version:{recipe_id}'
+
+
+def author_version_key(author_id):
+    return f'{PREFIX}:author-version:{author_id}'
+
+
+def _versions(*keys):
+    """Текущие номера версий; отсутствующие считаются равными 1."""
+    found = cache.get_many(keys)
+    return [found.get(key, 1) for key in keys]
+
+
+def bump(key):
+    """Увеличивает номер версии, делая устаревшими зависимые записи."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def _get(key):
+    value = cache.get(key)
+    RESPONSE_CACHE_LOOKUPS.labels('miss' if value is None else 'hit').inc()
+    return value
+
+
+def list_key(request):
+    """Ключ страницы списка: версия списка, хост и параметры запроса."""
+    query = sorted(request.query_params.lists())
+    digest = hashlib.md5(
+        f'{request.get_host()}?{query}'.encode(), usedforsecurity=False
+    ).hexdigest()
+    global_version, list_version = _versions(GLOBAL_VERSION, LIST_VERSION)
+    return f'{PREFIX}:list:{global_version}:{list_version}:{digest}'
+
+
+def get_list(request):
+    return _get(list_key(request))
+
+
+def set_list(request, data):
+    cache.set(list_key(request), data, settings.RECIPE_CACHE_TIMEOUT)
+
+
+def detail_key(request, recipe_id):
+    global_version, recipe_version = _versions(
+        GLOBAL_VERSION, recipe_version_key(recipe_id))
+    return (
+        f'{PREFIX}:detail:{global_version}:{recipe_version}:'
+        f'{request.get_host()}:{recipe_id}'
+    )
+
+
+def get_detail(request, recipe_id):
+    """Запись о рецепте, если и рецепт, и его автор не менялись."""
+    entry = _get(detail_key(request, recipe_id))
+    if entry is None:
+        return None
+    author_version, = _versions(author_version_key(entry['author_id']))
+    if author_version != entry['author_version']:
+        return None
+    return entry
+
+
+def set_detail(request, recipe, etag, data):
+    author_version, = _versions(author_version_key(recipe.author_id))
+    cache.set(
+        detail_key(request, recipe.pk),
+        {
+            'author_id': recipe.author_id,
+            'author_version': author_version,
+            'etag': etag,
+            'updated_at': recipe.updated_at,
+            'data': data,
+        },
+        settings.RECIPE_CACHE_TIMEOUT,
+    )
@@ -0,0 +1,47 @@
+"""Поиск рецептов и ингредиентов.
+
+В PostgreSQL используются триграммные GIN-индексы (``pg_trgm``) по
+названиям и полнотекстовый поиск по описанию рецепта с русской
+конфигурацией. На других СУБД (SQLite в тестовых настройках) поиск
+сводится к ``icontains``.
+"""
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+)
+from django.db import connection
+from django.db.models import Q
+
+SEARCH_CONFIG = 'russian'
+
+
+def is_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие по названию или описанию, по релевантности."""
+    if not is_postgresql():
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query))
+    text_vector = SearchVector('text', config=SEARCH_CONFIG)
+    text_query = SearchQuery(
+        query, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.alias(text_vector=text_vector).annotate(
+        search_rank=(
+            TrigramWordSimilarity(query, 'name')
+            + SearchRank(text_vector, text_query)
+        ),
+    ).filter(
+        Q(name__trigram_word_similar=query) | Q(text_vector=text_query)
+    ).order_by('-search_rank', '-date_published', '-id')
+
+
+def search_ingredients(queryset, query):
+    """Ингредиенты с похожим названием (с учётом опечаток)."""
+    if not is_postgresql():
+        return queryset.filter(name__icontains=query)
+    return queryset.annotate(
+        search_rank=TrigramWordSimilarity(query, 'name'),
+    ).filter(
+        name__trigram_word_similar=query
+    ).order_by('-search_rank', 'name')
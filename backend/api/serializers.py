@@ -1,41 +1,110 @@
+from PIL import Image
 from rest_framework import serializers
-from drf_extra_fields.fields import Base64ImageField
+from drf_extra_fields.fields import Base64ImageField as BaseBase64ImageField
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth.password_validation import validate_password
 from base.models import (
     Ingredient, Recipe, RecipeIngredient, Subscription,
-    Favorite, ShoppingCart
+    Favorite, ShoppingCart, ShoppingCartTotal, ImageTask
 )
+from base.images import rendition_urls
+
+from .instrumentation import measure_serializer
+from .metrics import IMAGE_UPLOAD_BYTES
 
 
 User = get_user_model()
 
 
+class Base64ImageField(BaseBase64ImageField):
+    """Изображение в base64.
+
+    Принимает также файл, уже декодированный
+    ``StreamingBase64JSONParser``, не загружая его целиком в память.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            image = self.decoded_file_to_internal_value(data)
+        else:
+            image = super().to_internal_value(data)
+        if image is not None:
+            IMAGE_UPLOAD_BYTES.labels(self.field_name).observe(image.size)
+        return image
+
+    def decoded_file_to_internal_value(self, data):
+        try:
+            with Image.open(data) as image:
+                extension = (image.format or '').lower()
+        except (OSError, ValueError):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        extension = 'jpg' if extension == 'jpeg' else extension
+        if extension not in self.ALLOWED_TYPES:
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        data.seek(0)
+        data.name = f'{self.get_file_name(None)}.{extension}'
+        return serializers.ImageField.to_internal_value(self, data)
+
+
+class TimedRepresentationMixin:
+    """Учитывает время сериализации в метриках запроса."""
+
+    def to_representation(self, instance):
+        with measure_serializer():
+            return super().to_representation(instance)
+
+
+class RenditionsField(serializers.ReadOnlyField):
+    """URL уменьшенных копий изображения по форматам и размерам.
+
+    Копии строятся в фоне; пока изображение в очереди, поле пустое.
+    """
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        super().__init__(source='*', **kwargs)
+
+    def to_representation(self, instance):
+        return rendition_urls(
+            self.context.get('request'),
+            getattr(instance, self.image_field),
+            getattr(instance, f'{self.image_field}_renditions'),
+        )
+
+
 class AvatarSerializer(serializers.ModelSerializer):
     """Сериализатор для аватара пользователя."""
     avatar = Base64ImageField()
+    avatar_renditions = RenditionsField('avatar')
 
     class Meta:
         model = User
-        fields = ('avatar',)
+        fields = ('avatar', 'avatar_renditions')
 
 
-class UserSerializer(DjoserUserSerializer):
+class UserSerializer(TimedRepresentationMixin, DjoserUserSerializer):
     """Сериализатор для пользователя."""
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField()
+    avatar_renditions = RenditionsField('avatar')
 
     class Meta:
         model = User
         fields = (
             'email', 'id', 'username', 'first_name', 'last_name',
-            'is_subscribed', 'avatar'
+            'is_subscribed', 'avatar', 'avatar_renditions'
         )
 
     def get_is_subscribed(self, author):
         """Проверяет, подписан ли текущий пользователь на автора."""
+        if hasattr(author, 'is_subscribed'):
+            # Признак уже вычислен в запросе (аннотация)
+            return author.is_subscribed
         request = self.context.get('request')
         return (
             request and
@@ -48,26 +117,26 @@ class UserSerializer(DjoserUserSerializer):
 class UserSubscriptionSerializer(UserSerializer):
     """Сериализатор для информации о пользователе
     с его подписками и рецептами"""
-    recipes_count = serializers.IntegerField(source='recipes.count',
-                                             read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
     recipes = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = (
             'email', 'id', 'username', 'first_name', 'last_name',
-            'is_subscribed', 'recipes', 'recipes_count', 'avatar'
+            'is_subscribed', 'recipes', 'recipes_count', 'avatar',
+            'avatar_renditions'
         )
 
     def get_recipes(self, author):
+        """Последние рецепты автора, выбранные в запросе представления."""
         return RecipeSerializer(
-            author.recipes.all()[:int(self.context.get('request').GET.get(
-                'recipes_limit', 10**10))], 
-            many=True, context=self.context
+            author.limited_recipes, many=True, context=self.context
         ).data
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedRepresentationMixin,
+                           serializers.ModelSerializer):
     """Сериализатор для ингредиентов."""
     class Meta:
         model = Ingredient
@@ -90,7 +159,8 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedRepresentationMixin,
+                       serializers.ModelSerializer):
     """Сериализатор для рецептов."""
     author = UserSerializer(read_only=True)
     ingredients = IngredientInRecipeSerializer(
@@ -100,12 +170,14 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_renditions = RenditionsField('image')
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_renditions',
+            'text', 'cooking_time'
         )
 
     def validate(self, data):
@@ -117,7 +189,9 @@ class RecipeSerializer(serializers.ModelSerializer):
                 "Должен быть хотя бы один ингредиент."
             )
 
-        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
+        ingredient_ids = [
+            ingredient['ingredient'].id for ingredient in ingredients
+        ]
 
         if len(set(ingredient_ids)) != len(ingredient_ids):
             raise serializers.ValidationError(
@@ -126,8 +200,16 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return data
 
+    def to_representation(self, instance):
+        """Передаёт автору аннотированный признак подписки."""
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
         """Проверяет, добавлен ли рецепт в избранное."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (
             request and
@@ -138,6 +220,8 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Проверяет, добавлен ли рецепт в корзину покупок."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (
             request and
@@ -151,21 +235,36 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients_data = validated_data.pop('recipe_ingredients', [])
         recipe = super().create(validated_data)
         self.create_recipe_ingredients(recipe, ingredients_data)
+        ImageTask.objects.enqueue(recipe, 'image')
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Обновляет рецепт и связанные ингредиенты."""
         ingredients_data = validated_data.pop('recipe_ingredients', [])
         instance.recipe_ingredients.all().delete()
         self.create_recipe_ingredients(instance, ingredients_data)
-        return super().update(instance, validated_data)
+        # Удалённые строки учитывают сигналы, а bulk_create их не
+        # отправляет: итоги корзин по новым ингредиентам пересчитываются
+        # явно
+        cart_user_ids = list(ShoppingCart.objects.filter(
+            recipe=instance).values_list('user_id', flat=True))
+        if cart_user_ids:
+            ShoppingCartTotal.objects.refresh(
+                cart_user_ids,
+                {item['ingredient'].id for item in ingredients_data},
+            )
+        instance = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            ImageTask.objects.enqueue(instance, 'image')
+        return instance
 
     def create_recipe_ingredients(self, recipe, ingredients_data):
         """Создаёт ингредиенты для рецепта."""
         RecipeIngredient.objects.bulk_create(
             RecipeIngredient(
                 recipe=recipe,
-                ingredient_id=ingredient['id'],
+                ingredient=ingredient['ingredient'],
                 amount=ingredient['amount']
             )
             for ingredient in ingredients_data
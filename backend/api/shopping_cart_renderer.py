@@ -1,31 +1,55 @@
+import csv
+
 from django.utils.timezone import now
 
 
-def render_shopping_cart(user, ingredients, recipes):
-    """Генерирует текст для списка покупок пользователя."""
-    # Формируем заголовок списка покупок
-    shopping_cart_header = (
-        f"Список покупок на"
-        f"{now().strftime('%d-%m-%Y %H:%M:%S')}\n"
-    )
-    # Формируем список ингредиентов
-    ingredient_lines = [
-        f"{idx}. {item['ingredient__name'].capitalize()} "
-        f"({item['ingredient__measurement_unit']}) - {item['total_amount']}"
-        for idx, item in enumerate(ingredients, start=1)
-    ]
-
-    # Формируем список рецептов с автором
-    recipe_lines = [
-        f"- {recipe.name} (@{recipe.author.username})"
-        for recipe in recipes
-    ]
-
-    # Собираем итоговый текст
-    return '\n'.join([
-        shopping_cart_header,
-        'Продукты:\n',
-        *ingredient_lines,
-        '\nРецепты, использующие эти продукты:\n',
-        *recipe_lines,
-    ])
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def render_txt(ingredients, recipes):
+    """Построчно генерирует список покупок в текстовом виде."""
+    # Заголовок списка покупок
+    yield f"Список покупок на {now().strftime('%d-%m-%Y %H:%M:%S')}\n\n"
+
+    # Список ингредиентов
+    yield 'Продукты:\n\n'
+    for idx, item in enumerate(ingredients, start=1):
+        yield (
+            f"{idx}. {item['ingredient__name'].capitalize()} "
+            f"({item['ingredient__measurement_unit']}) - "
+            f"{item['total_amount']}\n"
+        )
+
+    # Список рецептов с автором
+    yield '\nРецепты, использующие эти продукты:\n\n'
+    for name, username in recipes:
+        yield f"- {name} (@{username})\n"
+
+
+def render_csv(ingredients, recipes):
+    """Построчно генерирует список покупок в формате CSV."""
+    writer = csv.writer(_Echo())
+    # BOM, чтобы Excel распознал UTF-8
+    yield '\ufeff'
+    yield writer.writerow(('Продукт', 'Единица измерения', 'Количество'))
+    for item in ingredients:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['total_amount'],
+        ))
+    yield writer.writerow(())
+    yield writer.writerow(('Рецепт', 'Автор'))
+    for name, username in recipes:
+        yield writer.writerow((name, username))
+
+
+# Формат файла -> (функция-генератор, тип содержимого)
+SHOPPING_CART_RENDERERS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+}
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_login_failed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from base.models import Ingredient, Recipe, RecipeIngredient
+from base.signals import ingredients_imported
+
+from . import ingredient_index, response_cache
+from .metrics import AUTH_FAILURES
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete, ingredients_imported), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    """Сбрасывает поисковый индекс и кэш рецептов
+    при изменении справочника."""
+    ingredient_index.invalidate()
+    response_cache.bump(response_cache.GLOBAL_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    """Сбрасывает кэш рецепта и списков рецептов."""
+    response_cache.bump(response_cache.recipe_version_key(instance.pk))
+    response_cache.bump(response_cache.LIST_VERSION)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    response_cache.bump(response_cache.recipe_version_key(instance.recipe_id))
+    response_cache.bump(response_cache.LIST_VERSION)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_author(instance, update_fields=None, **kwargs):
+    """Сбрасывает кэш рецептов автора при изменении его данных."""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    response_cache.bump(response_cache.author_version_key(instance.pk))
+    response_cache.bump(response_cache.LIST_VERSION)
+
+
+@receiver(user_login_failed)
+def count_login_failure(**kwargs):
+    AUTH_FAILURES.inc()
@@ -0,0 +1,634 @@
+import base64
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import include, path
+from django.utils.http import http_date
+from django.utils.timezone import now
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APITestCase
+from PIL import Image
+from base.images import update_renditions
+from . import async_views, ingredient_index
+from .management.commands.explain_recipe_filters import (
+    DISTINCT_HEADER, EXISTS_HEADER)
+from .parsers import PayloadTooLarge, StreamingBase64JSONParser
+from base.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                         ShoppingCart, ShoppingCartTotal, Subscription)
+
+User = get_user_model()
+
+# Маршруты режима ASGI (см. api/urls.py) для AsyncViewsTests
+urlpatterns = [
+    path('api/recipes/', async_views.recipe_list),
+    path('api/recipes/<int:pk>/', async_views.recipe_detail),
+    path('api/ingredients/', async_views.ingredient_list),
+    path('api/', include('api.urls')),
+]
+
+
+class APIDataMixin:
+    """Пользователи, ингредиенты и рецепты для тестов API."""
+
+    def setUp(self):
+        cache.clear()
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(3)
+        )
+
+    def create_user(self, number):
+        return User.objects.create_user(
+            email=f'user{number}@example.com',
+            username=f'user{number}',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='password',
+        )
+
+    def create_recipe(self, author, name='Рецепт', amounts=(10, 20)):
+        recipe = Recipe.objects.create(
+            author=author, name=name, text='Описание',
+            cooking_time=10, image='recipes/images/test.jpg')
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=amount)
+            for ingredient, amount in zip(self.ingredients, amounts)
+        )
+        return recipe
+
+
+class RecipeListQueryCountTests(APIDataMixin, APITestCase):
+    """Число запросов страницы рецептов не зависит от её размера."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user(0)
+        authors = [self.create_user(number) for number in range(1, 4)]
+        for number in range(12):
+            recipe = self.create_recipe(
+                authors[number % len(authors)], name=f'Рецепт {number}')
+            if number % 2:
+                Favorite.objects.create(user=self.user, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        Subscription.objects.create(user=self.user, author=authors[0])
+
+    def assert_list_queries(self, count):
+        for limit in (2, 10):
+            cache.clear()
+            # COUNT(*), страница рецептов с авторами и признаками,
+            # ингредиенты рецептов страницы
+            with self.assertNumQueries(count):
+                response = self.client.get(f'/api/recipes/?limit={limit}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_list_queries(3)
+
+    def test_authenticated(self):
+        self.client.force_authenticate(self.user)
+        self.assert_list_queries(3)
+        results = self.client.get('/api/recipes/?limit=12').data['results']
+        self.assertEqual(
+            sum(recipe['is_favorited'] for recipe in results), 6)
+        self.assertEqual(
+            sum(recipe['is_in_shopping_cart'] for recipe in results), 8)
+        self.assertEqual(
+            sum(recipe['author']['is_subscribed'] for recipe in results), 4)
+
+
+class CursorPaginationTests(APIDataMixin, APITestCase):
+    """Курсор проходит группы строк с одинаковой датой публикации,
+    в том числе длиннее предела смещения курсора DRF (1000)."""
+
+    def setUp(self):
+        super().setUp()
+        author = self.create_user(0)
+        published = now()
+        Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'Рецепт {number}', text='Описание',
+                   cooking_time=10, image='recipes/images/test.jpg',
+                   date_published=published)
+            for number in range(1010)
+        )
+        self.create_recipe(author)
+
+    def walk(self, url, link):
+        """Идентификаторы рецептов всех страниц по ссылкам ``link``."""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            pages.append([recipe['id'] for recipe in
+                          response.data['results']])
+            url = response.data[link]
+        return pages
+
+    def test_pages_through_ties(self):
+        expected = list(Recipe.objects.order_by(
+            '-date_published', '-id').values_list('id', flat=True))
+        pages = self.walk('/api/recipes/?cursor=&limit=100', 'next')
+        self.assertEqual([len(page) for page in pages], [100] * 10 + [11])
+        self.assertEqual(sum(pages, []), expected)
+
+        last = self.client.get(
+            '/api/recipes/?cursor=&limit=100').data['next']
+        for _ in range(9):
+            last = self.client.get(last).data['next']
+        back = self.walk(last, 'previous')
+        self.assertEqual(sum(reversed(back), []), expected)
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', 'eyJrIjogWzFdfQ=='):
+            response = self.client.get(f'/api/recipes/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404)
+
+
+class ScoreOrderingTests(APIDataMixin, APITestCase):
+    """Сортировки по рейтингу листаются курсором по (рейтинг, id)."""
+
+    def test_cursor_over_scores(self):
+        author = self.create_user(0)
+        Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'Рецепт {number}', text='Описание',
+                   cooking_time=10, image='recipes/images/test.jpg',
+                   popularity_score=number % 7 / 3,
+                   trending_score=0.1 * number if number < 5 else 0)
+            for number in range(40)
+        )
+        for ordering, field in (('popular', '-popularity_score'),
+                                ('trending', '-trending_score')):
+            expected = list(Recipe.objects.order_by(field, '-id')
+                            .values_list('id', flat=True))
+            url = f'/api/recipes/?ordering={ordering}&cursor=&limit=6'
+            ids = []
+            while url:
+                response = self.client.get(url)
+                ids += [recipe['id'] for recipe in response.data['results']]
+                url = response.data['next']
+            self.assertEqual(ids, expected)
+
+    def test_search_with_cursor(self):
+        self.create_recipe(self.create_user(0), name='Борщ')
+        response = self.client.get('/api/recipes/?search=борщ&cursor=')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data)
+        response = self.client.get('/api/recipes/?search=Борщ')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        response = self.client.get(
+            '/api/recipes/?search=Борщ&ordering=newest&cursor=')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_unknown_ordering(self):
+        response = self.client.get('/api/recipes/?ordering=rating')
+        self.assertEqual(response.status_code, 400)
+
+
+class ShoppingCartTotalTests(APIDataMixin, APITestCase):
+    """Итоги корзины совпадают с корзиной при любых изменениях."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user(0)
+        self.recipe = self.create_recipe(self.author)
+        self.other = self.create_recipe(self.author, amounts=(1, 2, 3))
+        self.user = self.create_user(1)
+        for recipe in (self.recipe, self.other):
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        self.client.force_authenticate(self.user)
+
+    def totals(self):
+        return dict(ShoppingCartTotal.objects.filter(user=self.user)
+                    .values_list('ingredient__name', 'total_amount'))
+
+    def download(self):
+        return b''.join(self.client.get(
+            '/api/recipes/download_shopping_cart/'
+        ).streaming_content).decode()
+
+    def test_recipe_deletion(self):
+        self.assertEqual(self.totals(), {
+            'ингредиент 0': 11, 'ингредиент 1': 22, 'ингредиент 2': 3})
+        self.recipe.delete()
+        self.assertEqual(self.totals(), {
+            'ингредиент 0': 1, 'ингредиент 1': 2, 'ингредиент 2': 3})
+        self.assertIn('Ингредиент 0 (г) - 1\n', self.download())
+
+    def test_author_deletion(self):
+        self.author.delete()
+        self.assertEqual(self.totals(), {})
+        self.assertNotIn('Ингредиент 0', self.download())
+
+    def test_cart_removal(self):
+        ShoppingCart.objects.filter(recipe=self.other).delete()
+        self.assertEqual(self.totals(),
+                         {'ингредиент 0': 10, 'ингредиент 1': 20})
+        response = self.client.delete(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.totals(), {})
+
+    def test_recipe_ingredient_changes(self):
+        row = self.recipe.recipe_ingredients.get(
+            ingredient=self.ingredients[0])
+        row.amount = 100
+        row.save()
+        self.assertEqual(self.totals()['ингредиент 0'], 101)
+        row.ingredient = self.ingredients[2]
+        row.save()
+        self.assertEqual(self.totals(), {
+            'ингредиент 0': 1, 'ингредиент 1': 22, 'ингредиент 2': 103})
+        row.delete()
+        self.assertEqual(self.totals(), {
+            'ингредиент 0': 1, 'ингредиент 1': 22, 'ингредиент 2': 3})
+
+    def test_same_recipe_in_two_carts(self):
+        for self.user in (self.create_user(2), self.create_user(3)):
+            self.client.force_authenticate(self.user)
+            response = self.client.post(
+                f'/api/recipes/{self.recipe.pk}/shopping_cart/')
+            self.assertEqual(response.status_code, 201)
+
+            self.assertEqual(
+                self.totals(), {'ингредиент 0': 10, 'ингредиент 1': 20})
+            content = self.download()
+            self.assertIn('Ингредиент 0 (г) - 10\n', content)
+            self.assertIn('Ингредиент 1 (г) - 20\n', content)
+
+        stored = sorted(ShoppingCartTotal.objects.values_list(
+            'user_id', 'ingredient_id', 'total_amount'))
+        ShoppingCartTotal.objects.all().delete()
+        ShoppingCartTotal.objects.refresh()
+        self.assertEqual(
+            sorted(ShoppingCartTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount')),
+            stored)
+
+
+class RecipeRenditionsTests(APIDataMixin, APITestCase):
+    """Фоновая обработка изображения меняет Last-Modified рецепта."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_if_modified_since_after_renditions(self):
+        content = io.BytesIO()
+        Image.new('RGB', (40, 40), 'red').save(content, 'PNG')
+        recipe = self.create_recipe(self.create_user(0))
+        recipe.image = SimpleUploadedFile('test.png', content.getvalue())
+        recipe.save()
+        # Рецепт загружен раньше, чем воркер построил рендиции
+        Recipe.objects.filter(pk=recipe.pk).update(
+            updated_at=recipe.updated_at - timedelta(minutes=1))
+        recipe.refresh_from_db()
+        url = f'/api/recipes/{recipe.pk}/'
+        response = self.client.get(url)
+        self.assertEqual(response.data['image_renditions'], {})
+        self.assertEqual(response['Last-Modified'],
+                         http_date(recipe.updated_at.timestamp()))
+
+        update_renditions(recipe, 'image')
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('card', response.data['image_renditions'])
+
+
+class AsyncViewsTests(APIDataMixin, APITestCase):
+    """Асинхронные представления отвечают так же, как ViewSet'ы."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user(0)
+        self.recipe = self.create_recipe(self.user)
+        self.create_recipe(self.user, name='Другой рецепт')
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+
+    def get_both(self, url, **extra):
+        """Ответы синхронного и асинхронного представлений."""
+        sync_response = self.client.get(url, **extra)
+        cache.clear()
+        with override_settings(ROOT_URLCONF=__name__):
+            async_response = self.client.get(url, **extra)
+            cached_response = self.client.get(url, **extra)
+        return sync_response, async_response, cached_response
+
+    def assert_same(self, url, **extra):
+        sync_response, *async_responses = self.get_both(url, **extra)
+        self.assertEqual(sync_response.status_code, 200)
+        for response in async_responses:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), sync_response.json())
+            self.assertEqual(response.get('ETag'), sync_response.get('ETag'))
+        return async_responses
+
+    def assert_async(self, url):
+        for response in self.assert_same(url):
+            # Заголовок Allow проставляют только представления DRF
+            self.assertNotIn('Allow', response)
+
+    def test_recipes(self):
+        for url in ('/api/recipes/', '/api/recipes/?limit=1&page=2'):
+            # Промах кэша обрабатывает ViewSet, повтор — кэш
+            _, cached_response = self.assert_same(url)
+            self.assertNotIn('Allow', cached_response)
+        self.assert_async(f'/api/recipes/{self.recipe.pk}/')
+
+    def test_ingredients(self):
+        self.assert_async('/api/ingredients/')
+        self.assert_async('/api/ingredients/?name=ингредиент 1')
+        self.assert_async('/api/ingredients/?search=ингредиент')
+
+    def test_conditional_detail(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        etag = self.client.get(url)['ETag']
+        cache.clear()
+        with override_settings(ROOT_URLCONF=__name__):
+            for _ in range(2):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+            self.assertEqual(
+                self.client.get('/api/recipes/0/').status_code, 404)
+
+    def test_authenticated_falls_back_to_viewset(self):
+        token = Token.objects.create(user=self.user)
+        for response in self.assert_same(
+                f'/api/recipes/{self.recipe.pk}/',
+                HTTP_AUTHORIZATION=f'Token {token.key}'):
+            self.assertIs(response.json()['is_in_shopping_cart'], True)
+            self.assertIn('Allow', response)
+
+
+class ExplainRecipeFiltersTests(APIDataMixin, APITestCase):
+
+    def test_plans_for_each_filter(self):
+        user = self.create_user(0)
+        Favorite.objects.create(user=user, recipe=self.create_recipe(user))
+        output = io.StringIO()
+        call_command('explain_recipe_filters', stdout=output)
+        blocks = output.getvalue().split('\n/api/')[1:]
+        self.assertEqual([block.splitlines()[0] for block in blocks], [
+            'recipes/',
+            'recipes/?is_favorited=1',
+            'recipes/?is_in_shopping_cart=1',
+            'recipes/?is_favorited=1&is_in_shopping_cart=1',
+            'recipes/?is_favorited=0',
+        ])
+        for block in blocks:
+            exists_plan, distinct_plan = block.split(
+                EXISTS_HEADER)[1].split(DISTINCT_HEADER)
+            self.assertNotIn('DISTINCT', exists_plan.upper())
+            self.assertNotIn('UNIQUE', exists_plan.upper())
+            if '=1' in block.splitlines()[0]:
+                # JOIN с избранным или корзиной требовал DISTINCT
+                self.assertIn('DISTINCT', distinct_plan.upper())
+
+
+class RecipeFilterValuesTests(APIDataMixin, APITestCase):
+    """is_favorited и is_in_shopping_cart принимают 1/0 и true/false."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user(0)
+        self.favorite = self.create_recipe(self.user, name='Избранный')
+        self.create_recipe(self.user, name='Другой')
+        Favorite.objects.create(user=self.user, recipe=self.favorite)
+        self.client.force_authenticate(self.user)
+
+    def names(self, value):
+        response = self.client.get(
+            '/api/recipes/', {'is_favorited': value})
+        self.assertEqual(response.status_code, 200)
+        return {recipe['name'] for recipe in response.data['results']}
+
+    def test_boolean_spellings(self):
+        for value in ('1', 'true', 'True', 'yes', 'on'):
+            with self.subTest(value=value):
+                self.assertEqual(self.names(value), {'Избранный'})
+        for value in ('0', 'false', 'False', 'no', 'off'):
+            with self.subTest(value=value):
+                self.assertEqual(self.names(value), {'Другой'})
+
+    def test_unknown_value_is_ignored(self):
+        for value in ('', '2', 'maybe'):
+            with self.subTest(value=value):
+                self.assertEqual(self.names(value), {'Избранный', 'Другой'})
+
+
+class StreamingBase64JSONParserTests(APIDataMixin, APITestCase):
+    """Разбор не зависит от того, где тело разрезано на порции."""
+
+    # Байты 0xff дают в base64 символы «/», которые JSON экранирует
+    content = bytes(range(256)) + b'\xff' * 30
+
+    def parse(self, body, chunk_size):
+        parser = StreamingBase64JSONParser()
+        parser.chunk_size = chunk_size
+        return parser.parse(io.BytesIO(body), parser_context={})
+
+    def assert_parsed(self, body, expected_data, content_type=None):
+        for chunk_size in range(1, len(body) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                parsed = self.parse(body, chunk_size)
+                image = parsed.data.pop('image')
+                self.assertEqual(parsed.data, expected_data)
+                self.assertIs(parsed.files['image'], image)
+                self.assertEqual(image.read(), self.content)
+                self.assertEqual(image.content_type, content_type)
+                image.close()
+
+    def body(self, image, **fields):
+        return json.dumps({'image': '<image>', **fields}).replace(
+            '"<image>"', f'"{image}"').encode()
+
+    def test_escapes_and_nested_keys(self):
+        encoded = base64.b64encode(self.content).decode()
+        self.assertIn('/', encoded)
+        fields = {
+            'name': 'Кавычка " и слэш \\ / в названии',
+            'ingredients': [{'image': 'вложенное поле не файл'}],
+            'text': {'image': 'тоже не файл'},
+        }
+        self.assert_parsed(
+            self.body(encoded.replace('/', '\\/'), **fields), fields)
+        self.assert_parsed(
+            self.body(f'data:image/png;base64,{encoded}', **fields),
+            fields, content_type='image/png')
+
+    def test_empty_image(self):
+        parsed = self.parse(b'{"image": "", "name": "x"}', 4)
+        self.assertEqual(parsed.data, {'image': '', 'name': 'x'})
+        self.assertFalse(parsed.files)
+
+    def test_invalid_base64(self):
+        for image in ('@@@@', 'data:image/png;base64,AA\\nA', 'AAAAA'):
+            with self.subTest(image=image):
+                with self.assertRaises(ParseError):
+                    self.parse(self.body(image), 3)
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=200)
+    def test_oversized_image(self):
+        with self.assertRaises(PayloadTooLarge):
+            self.parse(self.body(base64.b64encode(self.content).decode()),
+                       16)
+
+    def test_api_errors(self):
+        user = self.create_user(0)
+        self.client.force_authenticate(user)
+        recipe = {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 1}],
+        }
+        response = self.client.post(
+            '/api/recipes/', {**recipe, 'image': '@@@@'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        with override_settings(IMAGE_UPLOAD_MAX_SIZE=200):
+            response = self.client.post('/api/recipes/', {
+                **recipe,
+                'image': base64.b64encode(self.content).decode(),
+            }, format='json')
+        self.assertEqual(response.status_code, 413)
+
+    def test_api_upload(self):
+        self.client.force_authenticate(self.create_user(0))
+        image = io.BytesIO()
+        Image.new('RGB', (10, 10), 'red').save(image, 'PNG')
+        encoded = base64.b64encode(image.getvalue()).decode()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post('/api/recipes/', {
+                'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+                'ingredients': [
+                    {'id': self.ingredients[0].pk, 'amount': 1}],
+                'image': f'data:image/png;base64,{encoded}',
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(Recipe.objects.get(
+            pk=response.data['id']).image.name.endswith('.png'))
+
+
+class ResponseCacheInvalidationTests(APIDataMixin, APITestCase):
+    """Изменения данных сбрасывают закэшированные ответы анонимам."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user(0)
+        self.recipe = self.create_recipe(self.author)
+        self.urls = ('/api/recipes/', f'/api/recipes/{self.recipe.pk}/')
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        return data['results'][0] if 'results' in data else data
+
+    def assert_changed(self, change, check):
+        for url in self.urls:
+            self.get(url)
+        change()
+        for url in self.urls:
+            with self.subTest(url=url):
+                check(self.get(url))
+
+    def test_recipe_update(self):
+        def change():
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+
+        self.assert_changed(
+            change,
+            lambda data: self.assertEqual(data['name'], 'Новое название'))
+
+    def test_recipe_ingredient_update(self):
+        def change():
+            row = self.recipe.recipe_ingredients.get(
+                ingredient=self.ingredients[0])
+            row.amount = 99
+            row.save()
+
+        self.assert_changed(change, lambda data: self.assertIn(
+            99, [item['amount'] for item in data['ingredients']]))
+
+    def test_ingredient_rename_and_delete(self):
+        ingredient = self.ingredients[0]
+
+        def rename():
+            ingredient.name = 'переименованный'
+            ingredient.save()
+
+        self.assert_changed(rename, lambda data: self.assertIn(
+            'переименованный',
+            [item['name'] for item in data['ingredients']]))
+        self.assert_changed(ingredient.delete, lambda data: self.assertEqual(
+            len(data['ingredients']), 1))
+
+    def test_author_update(self):
+        def change():
+            self.author.first_name = 'Другое'
+            self.author.save()
+
+        self.assert_changed(change, lambda data: self.assertEqual(
+            data['author']['first_name'], 'Другое'))
+
+    def test_recipe_delete(self):
+        for url in self.urls:
+            self.get(url)
+        self.recipe.delete()
+        self.assertEqual(self.client.get(self.urls[0]).data['results'], [])
+        self.assertEqual(self.client.get(self.urls[1]).status_code, 404)
+
+
+class IngredientIndexTests(APIDataMixin, APITestCase):
+    """Индекс ингредиентов не отдаёт устаревший справочник."""
+
+    def names(self, query='ингредиент'):
+        response = self.client.get(f'/api/ingredients/?name={query}')
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data]
+
+    def test_one_snapshot_per_request(self):
+        with mock.patch.object(ingredient_index, 'get_index',
+                               wraps=ingredient_index.get_index) as get:
+            self.names()
+        get.assert_called_once()
+
+    def test_import_invalidates_index(self):
+        self.assertEqual(len(self.names()), 3)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = f'{directory}/ingredients.json'
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump([{'name': 'ингредиент новый',
+                        'measurement_unit': 'г'}], file)
+        call_command('import_ingredients', path, stdout=io.StringIO())
+        self.assertIn('ингредиент новый', self.names())
+
+    def test_invalidation_from_another_process(self):
+        self.names()
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='ингредиент без сигнала', measurement_unit='г')])
+        self.assertNotIn('ингредиент без сигнала', self.names())
+        # Другой процесс увеличил номер поколения в общем кэше
+        cache.set(ingredient_index.GENERATION_KEY, 5, None)
+        self.assertIn('ингредиент без сигнала', self.names())
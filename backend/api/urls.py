@@ -1,7 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    IngredientViewSet, RecipeViewSet, UserViewSet
+    IngredientViewSet, RecipeViewSet, RequestStatsView, UserViewSet
 )
 
 router = DefaultRouter()
@@ -12,4 +13,19 @@ router.register('ingredients', IngredientViewSet, basename='ingredient')
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('stats/requests/', RequestStatsView.as_view(),
+         name='request-stats'),
 ]
+
+if settings.ASGI_MODE:
+    # Под ASGI чтение рецептов и ингредиентов обрабатывают асинхронные
+    # представления; маршруты идут раньше маршрутов роутера
+    from . import async_views
+
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list, name='recipe-list'),
+        path('recipes/<int:pk>/', async_views.recipe_detail,
+             name='recipe-detail'),
+        path('ingredients/', async_views.ingredient_list,
+             name='ingredient-list'),
+    ] + urlpatterns
@@ -1,26 +1,57 @@
-from django.http import FileResponse
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.urls import reverse
-from django.db.models import Sum
+from django.utils.http import content_disposition_header
+from django.db.models import (
+    BooleanField, F, Prefetch, Value
+)
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.exceptions import ValidationError
 from djoser.views import UserViewSet as DjoserUserViewSet
+from django_filters.rest_framework import DjangoFilterBackend
 from base.models import (
     Ingredient, Recipe, Favorite, Subscription, ShoppingCart,
-    RecipeIngredient
+    ShoppingCartTotal, ImageTask
 )
 from .serializers import (
     IngredientSerializer, RecipeSerializer,
     UserSerializer, AvatarSerializer, UserSubscriptionSerializer
 )
-from .shopping_cart_renderer import render_shopping_cart
+from .shopping_cart_renderer import SHOPPING_CART_RENDERERS
 from .permissions import IsAuthorOrReadOnly
+from .filters import RecipeFilter
+from .parsers import CloseUploadedFilesMixin, StreamingBase64JSONParser
+from .search import search_ingredients
+from .conditional import conditional_response, make_etag
+from . import ingredient_index, response_cache
+from .instrumentation import route_stats
+from .metrics import (RECIPE_RELATIONS, SHOPPING_LIST_DOWNLOADS,
+                      SUBSCRIPTIONS)
 
 User = get_user_model()
 
+# Размер порции строк при потоковом чтении из БД
+EXPORT_CHUNK_SIZE = 2000
+
+
+def recipe_etag(recipe):
+    """ETag рецепта, аннотированного ``with_user_annotations``."""
+    author = recipe.author
+    return make_etag(
+        recipe.pk, recipe.updated_at.isoformat(),
+        recipe.is_favorited, recipe.is_in_shopping_cart,
+        recipe.author_is_subscribed, author.email, author.username,
+        author.first_name, author.last_name, author.avatar.name,
+        recipe.image_renditions, author.avatar_renditions,
+    )
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet для работы с ингредиентами."""
@@ -29,60 +60,155 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.AllowAny]
     pagination_class = None  # Отключение пагинации для ингредиентов
 
-    def get_queryset(self):
-        """Фильтрация ингредиентов по имени."""
-        queryset = Ingredient.objects.all().order_by('name')
-        name = self.request.query_params.get('name')
-        if name:
-            queryset = queryset.filter(name__icontains=name)
-        return queryset
+    def list(self, request, *args, **kwargs):
+        """Поиск ингредиентов.
+
+        ``name`` — автодополнение по индексу в памяти,
+        ``search`` — нечёткий поиск в БД (с учётом опечаток).
+        """
+        name = request.query_params.get('name', '')
+        query = request.query_params.get('search', '').strip()
+        if query:
+            ingredients = search_ingredients(
+                self.get_queryset(), query
+            )[:settings.INGREDIENT_SEARCH_LIMIT]
+            return Response(self.get_serializer(ingredients, many=True).data)
+
+        # Список и автодополнение отдаются из индекса; ETag зависит
+        # от версии справочника, поэтому 304 не требует запросов к БД.
+        # ETag и ответ строятся по одному снимку индекса
+        index = ingredient_index.get_index()
+        return conditional_response(
+            request,
+            etag=make_etag(index.version, ingredient_index.normalize(name)),
+            get_response=lambda: Response(self.get_serializer(
+                index.search(name, settings.INGREDIENT_SEARCH_LIMIT) if name
+                else index.ingredients,
+                many=True
+            ).data),
+        )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(CloseUploadedFilesMixin, viewsets.ModelViewSet):
     """ViewSet для работы с рецептами."""
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [IsAuthorOrReadOnly]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = RecipeFilter
+    parser_classes = [
+        StreamingBase64JSONParser, FormParser, MultiPartParser
+    ]
+    # Порядки списка по параметру ordering; рейтинги заранее
+    # рассчитывает update_recipe_scores, и каждому порядку
+    # соответствует индекс
+    orderings = {
+        'newest': ('-date_published', '-id'),
+        'popular': ('-popularity_score', '-id'),
+        'trending': ('-trending_score', '-id'),
+    }
+    cursor_ordering = orderings['newest']
+    cursor_required = False
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action == 'list':
+            ordering = request.query_params.get('ordering') or 'newest'
+            if ordering not in self.orderings:
+                raise ValidationError({'ordering': (
+                    'Допустимые значения: ' + ', '.join(self.orderings))})
+            self.cursor_ordering = self.orderings[ordering]
+        params = request.query_params
+        ranked = (params.get('search', '').strip()
+                  and not params.get('ordering'))
+        cursor = (self.cursor_required
+                  or self.paginator.cursor_query_param in params)
+        if self.action in ('list', 'feed') and ranked and cursor:
+            # Курсор листает по своему ключу и отбросил бы сортировку
+            # поиска по релевантности
+            raise ValidationError({'cursor': (
+                'Результаты поиска листаются по номеру страницы; '
+                'для курсора задайте ordering.')})
 
     def get_queryset(self):
-        """Фильтрация рецептов по автору, корзине и избранному."""
-        queryset = Recipe.objects.all().order_by('-date_published')
-        params = self.request.query_params
-
-        author_id = params.get('author')
-        if author_id:
-            queryset = queryset.filter(author_id=author_id)
-
-        if self.request.user.is_authenticated:
-            is_in_shopping_cart = params.get('is_in_shopping_cart')
-            if is_in_shopping_cart is not None:
-                if is_in_shopping_cart == '1':
-                    queryset = queryset.filter(
-                        shoppingcart__user=self.request.user
-                    )
-                elif is_in_shopping_cart == '0':
-                    queryset = queryset.exclude(
-                        shoppingcart__user=self.request.user
-                    )
-
-            is_favorited = params.get('is_favorited')
-            if is_favorited is not None:
-                if is_favorited == '1':
-                    queryset = queryset.filter(
-                        favorite__user=self.request.user
-                    )
-                elif is_favorited == '0':
-                    queryset = queryset.exclude(
-                        favorite__user=self.request.user
-                    )
-
-        return queryset.distinct()
+        """Рецепты с признаками избранного, корзины и подписки."""
+        return Recipe.objects.with_user_annotations(
+            self.request.user
+        ).order_by(*self.cursor_ordering)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.query_params.get('ordering'):
+            # Явно заданный порядок важнее сортировки поиска
+            # по релевантности
+            return queryset.order_by(*self.cursor_ordering)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """Список рецептов; ответы анонимам кэшируются."""
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        data = response_cache.get_list(request)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            response_cache.set_list(request, data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Рецепт с поддержкой условных запросов.
+
+        ETag учитывает дату изменения рецепта, данные автора и признаки
+        избранного/корзины/подписки текущего пользователя.
+        Last-Modified отдаётся только анонимам: для них ответ не зависит
+        от пользовательских связей. Ответы анонимам кэшируются.
+        """
+        anonymous = not request.user.is_authenticated
+        entry = anonymous and response_cache.get_detail(
+            request, kwargs[self.lookup_field])
+        if entry:
+            return conditional_response(
+                request,
+                etag=entry['etag'],
+                last_modified=entry['updated_at'],
+                get_response=lambda: Response(entry['data']),
+                vary_on_user=True,
+            )
+
+        recipe = self.get_object()
+        etag = recipe_etag(recipe)
+
+        def get_response():
+            data = self.get_serializer(recipe).data
+            if anonymous:
+                response_cache.set_detail(request, recipe, etag, data)
+            return Response(data)
+
+        return conditional_response(
+            request,
+            etag=etag,
+            last_modified=recipe.updated_at if anonymous else None,
+            get_response=get_response,
+            vary_on_user=True,
+        )
 
+    @transaction.atomic
     def perform_create(self, serializer):
         """Создание рецепта с указанием автора."""
         serializer.save(author=self.request.user)
+        User.objects.filter(pk=self.request.user.pk).update(
+            recipes_count=F('recipes_count') + 1)
+
+    def perform_destroy(self, instance):
+        """Удаление рецепта; итоги корзин, где он лежал, пересчитывают
+        сигналы удаления связанных строк."""
+        with transaction.atomic():
+            instance.delete()
+            User.objects.filter(
+                pk=instance.author_id, recipes_count__gt=0
+            ).update(recipes_count=F('recipes_count') - 1)
 
     @staticmethod
+    @transaction.atomic
     def handle_favorite_or_cart(request, model, pk):
         """Обрабатывает добавление и удал. рецепта в корзину или избранное."""
         recipe = get_object_or_404(Recipe, id=pk)
@@ -91,6 +217,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if request.method == 'POST':
             _, created = model.objects.get_or_create(user=user, recipe=recipe)
             if created:
+                RECIPE_RELATIONS.labels(model._meta.model_name, 'add').inc()
+                if model is Favorite:
+                    Recipe.objects.filter(pk=recipe.pk).update(
+                        favorites_count=F('favorites_count') + 1)
                 return Response(
                     {'status': 'Рецепт добавлен'},
                     status=status.HTTP_201_CREATED)
@@ -98,6 +228,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_400_BAD_REQUEST)
 
         get_object_or_404(model, user=user, recipe=recipe).delete()
+        RECIPE_RELATIONS.labels(model._meta.model_name, 'remove').inc()
+        if model is Favorite:
+            Recipe.objects.filter(
+                pk=recipe.pk, favorites_count__gt=0
+            ).update(favorites_count=F('favorites_count') - 1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'])
@@ -110,33 +245,68 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Добавление и удаление рецептов из избранного."""
         return self.handle_favorite_or_cart(request, Favorite, pk)
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'],
+            permission_classes=[permissions.IsAuthenticated])
     def download_shopping_cart(self, request):
-        """Скачивание списка покупок."""
-        # Получаем ингредиенты и их количество
+        """Скачивание списка покупок.
+
+        Файл формируется потоково: строки отдаются клиенту по мере чтения
+        курсоров БД. Формат задаётся параметром ``file_format``
+        (``txt`` по умолчанию или ``csv``).
+        """
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_CART_RENDERERS:
+            raise ValidationError({'file_format': (
+                'Допустимые форматы: '
+                f'{", ".join(SHOPPING_CART_RENDERERS)}'
+            )})
+        render, content_type = SHOPPING_CART_RENDERERS[file_format]
+        SHOPPING_LIST_DOWNLOADS.labels(file_format).inc()
         user = request.user
 
+        # Итоги по ингредиентам поддерживаются сигналами при изменении
+        # корзины и ингредиентов рецептов
         ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__shoppingcart__user=user)
+            ShoppingCartTotal.objects
+            .filter(user=user)
             .values('ingredient__name',
-                    'ingredient__measurement_unit')
-            .annotate(total_amount=Sum('amount'))
+                    'ingredient__measurement_unit',
+                    'total_amount')
             .order_by('ingredient__name')
         )
 
-        # Получаем перечень рецептов
-        recipes = Recipe.objects.filter(
-            shoppingcart__user=user)   # у рец. нет, а у shopcart user - есть
-
-        shopping_cart_text = render_shopping_cart(user, ingredients, recipes)
+        # Перечень рецептов с авторами одним запросом
+        recipes = (
+            Recipe.objects
+            .filter(shoppingcart__user=user)
+            .values_list('name', 'author__username')
+            .order_by('name')
+        )
 
-        return FileResponse(
-            shopping_cart_text,
-            as_attachment=True,
-            filename='shopping_cart.txt',
-            content_type='text/plain'
+        response = StreamingHttpResponse(
+            render(
+                ingredients.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+                recipes.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+            ),
+            content_type=content_type
         )
+        response['Content-Disposition'] = content_disposition_header(
+            as_attachment=True, filename=f'shopping_cart.{file_format}')
+        return response
+
+    @action(detail=False, methods=['get'], cursor_required=True,
+            permission_classes=[permissions.IsAuthenticated])
+    def feed(self, request):
+        """Рецепты авторов из подписок пользователя, от новых к старым.
+
+        Листание только курсором, чтобы дальние страницы не требовали
+        OFFSET; способ выборки см. ``RecipeQuerySet.followed_by``.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).followed_by(
+            request.user, self.paginator.get_page_size(request))
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_link(self, request, pk=None):
@@ -148,15 +318,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response({'short-link': short_url}, status=status.HTTP_200_OK)
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(CloseUploadedFilesMixin, DjoserUserViewSet):
     """ViewSet для управления пользователями."""
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = "id"  # Используем ID для поиска пользователей
+    cursor_ordering = None
 
     @action(detail=False, methods=['put', 'delete'], permission_classes=[
-        permissions.IsAuthenticated], url_path='me/avatar')
+        permissions.IsAuthenticated], url_path='me/avatar',
+        parser_classes=[StreamingBase64JSONParser])
     def avatar(self, request):
         """Управление аватаром пользователя."""
         user = request.user
@@ -166,6 +338,7 @@ class UserViewSet(DjoserUserViewSet):
                 user.avatar.delete()
                 user.avatar = None
                 user.save()
+                ImageTask.objects.enqueue(user, 'avatar')
                 return Response(
                     {'avatar': None},
                     status=status.HTTP_204_NO_CONTENT)
@@ -177,16 +350,34 @@ class UserViewSet(DjoserUserViewSet):
             raise ValidationError(serializer.errors)
 
         serializer.save()
+        ImageTask.objects.enqueue(user, 'avatar')
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'], permission_classes=[
-        permissions.IsAuthenticated])
+        permissions.IsAuthenticated], cursor_ordering=('subscription_id',))
     def subscriptions(self, request):
         """Получение списка подписок пользователя."""
-        subscriptions = request.user.subscribers.select_related(
-            'author').prefetch_related('author__recipes')
+        recipes_limit = request.query_params.get('recipes_limit')
+        try:
+            recipes_limit = int(recipes_limit) if recipes_limit else None
+        except ValueError:
+            raise ValidationError(
+                {'recipes_limit': 'Ожидается целое число'})
+
+        authors = User.objects.filter(
+            authors__user=request.user
+        ).annotate(
+            subscription_id=F('authors__id'),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).prefetch_related(Prefetch(
+            'recipes',
+            queryset=Recipe.objects.with_user_annotations(
+                request.user
+            ).latest_per_author(recipes_limit).order_by(
+                '-date_published', '-id'),
+            to_attr='limited_recipes',
+        )).order_by('subscription_id')
 
-        authors = [subscription.author for subscription in subscriptions]
         page = self.paginate_queryset(authors)
         serializer = UserSubscriptionSerializer(page, many=True, context={
             'request': request})
@@ -194,6 +385,7 @@ class UserViewSet(DjoserUserViewSet):
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[permissions.IsAuthenticated])
+    @transaction.atomic
     def subscribe(self, request, id=None):
         """Подписка и отписка от автора."""
         user = request.user
@@ -210,9 +402,28 @@ class UserViewSet(DjoserUserViewSet):
 
             if not created:
                 raise ValidationError({'errors': 'Вы уже подписаны'})
+            User.objects.filter(pk=author.pk).update(
+                subscribers_count=F('subscribers_count') + 1)
+            SUBSCRIPTIONS.labels('subscribe').inc()
             return Response({'status': 'Подписка успешно добавлена'},
                             status=status.HTTP_201_CREATED)
 
         get_object_or_404(Subscription, user=user, author=author).delete()
+        User.objects.filter(
+            pk=author.pk, subscribers_count__gt=0
+        ).update(subscribers_count=F('subscribers_count') - 1)
+        SUBSCRIPTIONS.labels('unsubscribe').inc()
         return Response({'status': 'Вы успешно отписались'},
                         status=status.HTTP_204_NO_CONTENT)
+
+
+class RequestStatsView(APIView):
+    """Статистика запросов по маршрутам в текущем процессе."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(route_stats.snapshot())
+
+    def delete(self, request):
+        route_stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,12 +1,14 @@
 from django.contrib import admin
+from django.db.models import Count, Prefetch
 from django.utils.html import mark_safe
 from import_export.admin import ImportExportModelAdmin
 from import_export.resources import ModelResource
 from .models import (
     Ingredient, Recipe, RecipeIngredient,
-    Favorite, ShoppingCart, Subscription
+    Favorite, ShoppingCart, Subscription, ImageTask
 )
 from .filters import CookingTimeFilter
+from .images import thumbnail_url
 from django.contrib.auth import get_user_model
 
 
@@ -17,11 +19,16 @@ User = get_user_model()
 class UserAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'username', 'full_name', 'email', 'avatar_preview',
-        'recipe_count', 'subscription_count', 'subscriber_count'
+        'recipes_count', 'subscription_count', 'subscribers_count'
     )
     search_fields = ('username', 'email')
     list_filter = ('is_staff', 'is_active')
 
+    def get_queryset(self, request):
+        # Счётчики вычисляются в запросе списка, а не по запросу на строку
+        return super().get_queryset(request).annotate(
+            subscription_count=Count('subscribers', distinct=True))
+
     @admin.display(description="ФИО")
     def full_name(self, obj):
         return obj.full_name()
@@ -30,22 +37,15 @@ class UserAdmin(admin.ModelAdmin):
     @mark_safe
     def avatar_preview(self, obj):
         if obj.avatar:  # без этого выдаёт ошибку!
+            url = thumbnail_url(obj.avatar, obj.avatar_renditions)
             return (
-                f'<img src="{obj.avatar.url}" width="50" height="50" '
+                f'<img src="{url}" width="50" height="50" '
                 'style="border-radius:50%;">'
             )
 
-    @admin.display(description="Рецептов")
-    def recipe_count(self, obj):
-        return obj.recipes.count()
-
-    @admin.display(description="Подписок")
+    @admin.display(description="Подписок", ordering='subscription_count')
     def subscription_count(self, obj):
-        return obj.subscribers.count()
-
-    @admin.display(description="Подписчиков")
-    def subscriber_count(self, obj):
-        return obj.author.count()
+        return obj.subscription_count
 
 
 class IngredientResource(ModelResource):
@@ -82,9 +82,14 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('author', CookingTimeFilter)
     inlines = [RecipeIngredientInline]
 
-    @admin.display(description='В избранном')
-    def favorites_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related(
+            Prefetch('recipe_ingredients',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient'))
+        )
 
     @admin.display(description='Ингредиенты')
     @mark_safe
@@ -98,7 +103,7 @@ class RecipeAdmin(admin.ModelAdmin):
     @mark_safe
     def image_preview(self, obj):
         return (
-            f'<img src="{obj.image.url}" '
+            f'<img src="{thumbnail_url(obj.image, obj.image_renditions)}" '
             'style="max-height: 100px;'
             'max-width: 100px; border-radius: 10px;" />'
         )
@@ -123,3 +128,13 @@ class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
     list_filter = ('user', 'author')
     search_fields = ('user__username', 'author__username')
+
+
+@admin.register(ImageTask)
+class ImageTaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'model', 'object_id', 'field_name', 'status', 'attempts',
+        'run_after', 'created_at'
+    )
+    list_filter = ('status', 'model')
+    readonly_fields = ('last_error',)
@@ -1,5 +1,34 @@
-import numpy as np
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q
+
+# Кэш гистограммы сбрасывается при сохранении и удалении рецептов
+# (base/signals.py); таймаут страхует от массовых изменений без сигналов.
+HISTOGRAM_CACHE_KEY = 'admin:cooking-time-histogram'
+HISTOGRAM_CACHE_TIMEOUT = 10 * 60
+
+
+def cooking_time_histogram(queryset):
+    """Пороги и число рецептов в трёх равных по ширине интервалах
+    времени готовки; ``None``, если различных значений меньше трёх."""
+    bounds = queryset.aggregate(
+        low=Min('cooking_time'),
+        high=Max('cooking_time'),
+        distinct=Count('cooking_time', distinct=True),
+    )
+    if bounds['distinct'] < 3:
+        return None
+    width = (bounds['high'] - bounds['low']) / 3
+    fast_time = int(bounds['low'] + width)
+    slow_time = int(bounds['low'] + 2 * width)
+    counts = queryset.aggregate(
+        fast=Count('id', filter=Q(cooking_time__lt=fast_time)),
+        medium=Count('id', filter=Q(cooking_time__gte=fast_time,
+                                    cooking_time__lt=slow_time)),
+        slow=Count('id', filter=Q(cooking_time__gte=slow_time)),
+    )
+    return fast_time, slow_time, counts
 
 
 class CookingTimeFilter(admin.SimpleListFilter):
@@ -7,32 +36,37 @@ class CookingTimeFilter(admin.SimpleListFilter):
     parameter_name = "cooking_time_range"
 
     def lookups(self, request, model_admin):
-        # Получаем уникальные значения времени готовки
-        qs = model_admin.model.objects.values_list("cooking_time", flat=True)
-        times = [time for time in set(qs)]
-
-        if len(times) < 3:
+        histogram = cache.get(HISTOGRAM_CACHE_KEY)
+        if histogram is None:
+            histogram = cooking_time_histogram(
+                model_admin.model.objects.all())
+            # Отсутствие гистограммы тоже кэшируется
+            cache.set(HISTOGRAM_CACHE_KEY, histogram or (),
+                      HISTOGRAM_CACHE_TIMEOUT)
+        if not histogram:
             return []
+        fast_time, slow_time, counts = histogram
 
-        # Создаём гистограмму с 3 бинами
-        counts, bins = np.histogram(times, bins=3)
-
-        # Определяем пороги на основе этих бинов
-        fast_time, slow_time = int(bins[1]), int(bins[2])
-        #  без int выдаёт не целые числа, что неудобно
-
+        # Интервалы полуоткрытые: [начало, конец)
         return [
-            ((0, fast_time), f'быстрее {fast_time} мин ({counts[0]})'),
-            ((fast_time, slow_time), f'{fast_time}–{slow_time} мин ({counts[1]})'),
-            ((slow_time, 10**10), f'дольше {slow_time} мин ({counts[0]})'),
+            (f'-{fast_time}', f'быстрее {fast_time} мин ({counts["fast"]})'),
+            (f'{fast_time}-{slow_time}',
+             f'{fast_time}–{slow_time} мин ({counts["medium"]})'),
+            (f'{slow_time}-', f'от {slow_time} мин ({counts["slow"]})'),
         ]
 
     def queryset(self, request, queryset):
         value = self.value()
-        if value:
-            # Преобразуем строку из value() в кортеж через eval()
-            range_tuple = eval(value)
-            # Используем range для фильтрации по диапазону
-            return queryset.filter(cooking_time__range=range_tuple)
-
+        if not value:
+            return queryset
+        low, separator, high = value.partition('-')
+        if not separator or not (low or high):
+            raise IncorrectLookupParameters(value)
+        try:
+            if low:
+                queryset = queryset.filter(cooking_time__gte=int(low))
+            if high:
+                queryset = queryset.filter(cooking_time__lt=int(high))
+        except ValueError:
+            raise IncorrectLookupParameters(value)
         return queryset
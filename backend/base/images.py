@@ -0,0 +1,151 @@
+"""Подготовка изображений рецептов и аватаров.
+
+Для загруженного изображения строятся уменьшенные копии (рендиции)
+нескольких размеров в форматах WebP и JPEG; они сохраняются рядом
+с оригиналом, а пути к ним — в JSON-поле модели
+``<поле>_renditions`` вида ``{'card': {'webp': ..., 'jpg': ...}}``.
+Слишком большой оригинал заменяется уменьшенной копией.
+"""
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Наибольшая сторона рендиции, пикселей
+RENDITIONS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1280,
+}
+# Расширение файла -> формат Pillow
+FORMATS = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG',
+}
+# Наибольшая сторона сохраняемого оригинала
+MAX_ORIGINAL_SIDE = 2560
+QUALITY = 80
+
+
+def _encode(image, image_format):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A')
+                         if image.mode == 'RGBA' else None)
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def _open(field_file):
+    """Изображение для обработки и исходный формат файла."""
+    with field_file.open('rb'):
+        image = Image.open(field_file)
+        image.load()
+    source_format = image.format
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    return image, source_format
+
+
+def _replace(storage, name, content):
+    """Перезаписывает файл хранилища.
+
+    В локальном хранилище новое содержимое записывается во временный
+    файл рядом и переименовывается поверх старого, так что файл
+    по этому пути доступен всё время.
+    """
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        storage.delete(name)
+        storage.save(name, content)
+        return
+    with tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(path), delete=False) as temporary:
+        temporary.write(content.read())
+    shutil.copymode(path, temporary.name)
+    os.replace(temporary.name, path)
+
+
+def _bound_original(field_file, image, source_format):
+    """Уменьшает оригинал, если он больше допустимого размера.
+
+    Оригинал пересохраняется в своём формате, чтобы содержимое
+    соответствовало расширению; форматы, которые Pillow не умеет
+    записывать, остаются как есть.
+    """
+    if (max(image.size) <= MAX_ORIGINAL_SIDE
+            or source_format not in Image.SAVE):
+        return image
+    image.thumbnail((MAX_ORIGINAL_SIDE, MAX_ORIGINAL_SIDE), Image.LANCZOS)
+    _replace(field_file.storage, field_file.name,
+             _encode(image, source_format))
+    return image
+
+
+def build_renditions(field_file):
+    """Сохраняет рендиции изображения и возвращает пути к ним."""
+    image = _bound_original(field_file, *_open(field_file))
+    storage = field_file.storage
+    directory, filename = os.path.split(field_file.name)
+    stem = os.path.splitext(filename)[0]
+    renditions = {}
+    for name, side in RENDITIONS.items():
+        rendition = image.copy()
+        rendition.thumbnail((side, side), Image.LANCZOS)
+        for extension, image_format in FORMATS.items():
+            renditions.setdefault(name, {})[extension] = storage.save(
+                os.path.join(
+                    directory, 'renditions', f'{stem}_{name}.{extension}'),
+                _encode(rendition, image_format),
+            )
+    return renditions
+
+
+def delete_renditions(storage, renditions):
+    for files in renditions.values():
+        for path in files.values():
+            storage.delete(path)
+
+
+def update_renditions(instance, field_name):
+    """Перестраивает рендиции поля-изображения и сохраняет их в модели."""
+    field_file = getattr(instance, field_name)
+    renditions_field = f'{field_name}_renditions'
+    delete_renditions(field_file.storage,
+                      getattr(instance, renditions_field) or {})
+    setattr(instance, renditions_field,
+            build_renditions(field_file) if field_file else {})
+    # Поля auto_now (Recipe.updated_at) сохраняются вместе с рендициями:
+    # по ним отдаётся Last-Modified, и без этого условные запросы
+    # получали бы 304 с устаревшим списком рендиций
+    instance.save(update_fields=[renditions_field] + [
+        field.name for field in instance._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+    ])
+
+
+def rendition_urls(request, field_file, renditions):
+    """URL рендиций для ответа API (абсолютные, если известен запрос)."""
+    def url(path):
+        url = field_file.storage.url(path)
+        return request.build_absolute_uri(url) if request else url
+
+    return {
+        name: {
+            extension: url(path) for extension, path in files.items()
+        }
+        for name, files in (renditions or {}).items()
+    }
+
+
+def thumbnail_url(field_file, renditions):
+    """URL миниатюры, а пока её нет — оригинала."""
+    path = (renditions or {}).get('thumbnail', {}).get('jpg')
+    return field_file.storage.url(path) if path else field_file.url
@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from base.models import ImageTask, Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Постановка в очередь обработки изображений '
+            'без уменьшенных копий')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перестроить копии для всех изображений')
+
+    def handle(self, *args, **options):
+        for model, field_name in ((Recipe, 'image'), (User, 'avatar')):
+            queryset = model.objects.exclude(
+                **{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            if not options['all']:
+                queryset = queryset.filter(**{f'{field_name}_renditions': {}})
+            queued = 0
+            for instance in queryset.iterator(chunk_size=100):
+                ImageTask.objects.enqueue(instance, field_name)
+                queued += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: '
+                f'поставлено в очередь {queued}'))
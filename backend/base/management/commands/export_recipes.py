@@ -0,0 +1,112 @@
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from base.models import (Favorite, Recipe, RecipeIngredient, ShoppingCart,
+                         Subscription)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Выгрузка пользователей, рецептов, подписок, избранного '
+            'и корзин в NDJSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для выгрузки; «-» — стандартный вывод')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Число записей, читаемых из БД за один запрос')
+
+    def handle(self, *args, **options):
+        self.chunk_size = options['chunk_size']
+        path = options['path']
+        if path == '-':
+            self.export(sys.stdout)
+        else:
+            with open(path, 'w', encoding='utf-8') as file:
+                self.export(file)
+
+    def export(self, file):
+        sections = (
+            ('user', self.users()),
+            ('recipe', self.recipes()),
+            ('subscription',
+             self.relations(Subscription, 'author', 'author__email')),
+            ('favorite', self.recipe_relations(Favorite)),
+            ('shopping_cart', self.recipe_relations(ShoppingCart)),
+        )
+        for record_type, records in sections:
+            count = 0
+            for record in records:
+                file.write(json.dumps(
+                    {'type': record_type, **record}, ensure_ascii=False))
+                file.write('\n')
+                count += 1
+            self.stderr.write(f'{record_type}: выгружено {count}')
+
+    def users(self):
+        # Права администратора не переносятся
+        return User.objects.order_by('id').values(
+            'email', 'username', 'first_name', 'last_name', 'password',
+            'avatar',
+        ).iterator(chunk_size=self.chunk_size)
+
+    def recipes(self):
+        """Рецепты с ингредиентами, выбираемые пачками по id."""
+        last_id = 0
+        while True:
+            chunk = list(
+                Recipe.objects
+                .filter(id__gt=last_id)
+                .order_by('id')
+                .values('id', 'author__email', 'name', 'image', 'text',
+                        'cooking_time', 'date_published')
+                [:self.chunk_size]
+            )
+            if not chunk:
+                return
+            last_id = chunk[-1]['id']
+            ingredients = {}
+            for recipe_id, name, unit, amount in (
+                RecipeIngredient.objects
+                .filter(recipe_id__in=[recipe['id'] for recipe in chunk])
+                .order_by('id')
+                .values_list('recipe_id', 'ingredient__name',
+                             'ingredient__measurement_unit', 'amount')
+            ):
+                ingredients.setdefault(recipe_id, []).append(
+                    [name, unit, amount])
+            for recipe in chunk:
+                yield {
+                    'id': recipe['id'],
+                    'author': recipe['author__email'],
+                    'name': recipe['name'],
+                    'image': recipe['image'],
+                    'text': recipe['text'],
+                    'cooking_time': recipe['cooking_time'],
+                    'date_published': recipe['date_published'].isoformat(),
+                    'ingredients': ingredients.get(recipe['id'], []),
+                }
+
+    def relations(self, model, key, target):
+        """Связи пользователя с автором или рецептом."""
+        for user, value in (
+            model.objects.order_by('id')
+            .values_list('user__email', target)
+            .iterator(chunk_size=self.chunk_size)
+        ):
+            yield {'user': user, key: value}
+
+    def recipe_relations(self, model):
+        """Избранное или корзина с датой добавления."""
+        for user, recipe, added_at in (
+            model.objects.order_by('id')
+            .values_list('user__email', 'recipe_id', 'added_at')
+            .iterator(chunk_size=self.chunk_size)
+        ):
+            yield {'user': user, 'recipe': recipe,
+                   'added_at': added_at.isoformat()}
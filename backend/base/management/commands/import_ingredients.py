@@ -1,43 +1,207 @@
+import csv
+import io
 import json
 import os
+from itertools import islice
+
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from base.models import Ingredient
-import traceback
+from base.signals import ingredients_imported
+
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field(
+    'measurement_unit').max_length
+
+
+def read_csv(file):
+    """Строки CSV-файла: с заголовком name,measurement_unit или без него."""
+    for row in csv.reader(file):
+        if row == ['name', 'measurement_unit']:
+            continue
+        if len(row) != 2:
+            yield None
+            continue
+        yield row
+
+
+def read_json(file, chunk_size=64 * 1024):
+    """Элементы JSON-массива, прочитанные из файла по частям."""
+    decoder = json.JSONDecoder()
+    buffer, position = '', 0
+    started = False
+    while True:
+        # Пропускаем пробелы и запятые между элементами
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position == len(buffer):
+            buffer, position = file.read(chunk_size), 0
+            if not buffer:
+                raise CommandError('Неожиданный конец JSON-файла.')
+            continue
+        if not started:
+            if buffer[position] != '[':
+                raise CommandError('Ожидался JSON-массив ингредиентов.')
+            started = True
+            position += 1
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # Элемент не поместился в буфер — дочитываем файл
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise CommandError('Некорректный JSON-файл.')
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if isinstance(item, dict):
+            yield [item.get('name'), item.get('measurement_unit')]
+        else:
+            yield None
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+
+
+def clean(row):
+    """Нормализованная пара (название, единица) или None."""
+    if row is None:
+        return None
+    name, unit = (
+        value.strip() if isinstance(value, str) else '' for value in row)
+    if (not name or not unit or len(name) > NAME_MAX_LENGTH
+            or len(unit) > UNIT_MAX_LENGTH):
+        return None
+    return name, unit
+
+
+class CopyBuffer(io.TextIOBase):
+    """Файлоподобный поток CSV-строк для COPY ... FROM STDIN."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator='\n')
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            writer.writerow(row)
+            self.buffer += output.getvalue()
+            output.seek(0)
+            output.truncate()
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
 
 
 class Command(BaseCommand):
-    help = 'Загрузка ингредиентов из JSON-фикстуры'
+    help = 'Потоковая загрузка ингредиентов из CSV или JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'data',
+                                 'ingredients.json'),
+            help='Путь к файлу (по умолчанию data/ingredients.json)')
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат файла; по умолчанию определяется по расширению')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для вставки')
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже на PostgreSQL')
 
-    def handle(self, *args, **kwargs):
-        file_name = 'ingredients.json'  # Имя JSON файла
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = (options['format']
+                       or os.path.splitext(path)[1].lstrip('.').lower())
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат файла "{path}". Укажите --format.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+        self.total = self.invalid = 0
         try:
-            # Формируем путь к файлу
-            file_path = os.path.join(settings.BASE_DIR, 'data', file_name)
-
-            # Открываем файл и загружаем данные
-            with open(file_path, 'r', encoding='utf-8') as file:
-
-                # Массовое создание новых ингредиентов
-                created_ingredients = Ingredient.objects.bulk_create(
-                    [
-                        Ingredient(**ingredient)
-                        for ingredient in json.load(file)
-                    ],
-                    ignore_conflicts=True  # Игнорировать конфликты
-                )
-
-            # Выводим успешный результат
-            self.stdout.write(self.style.SUCCESS(
-                f'Данные успешно загружены! '
-                f'Добавлено записей: {len(created_ingredients)}'
-            ))
-
-        except Exception as e:
-            # Выводим полную трассировку ошибки
-            self.stdout.write(self.style.ERROR(
-                f'Произошла ошибка при обработке файла "{file_name}": {str(e)}'
-            ))
-            # Дополнительная информация для диагностики
-            self.stdout.write(self.style.ERROR(
-                f'Полная трассировка ошибки:\n{traceback.format_exc()}'))
+            with open(path, encoding='utf-8', newline='') as file:
+                rows = self.clean_rows(READERS[file_format](file))
+                if (connection.vendor == 'postgresql'
+                        and not options['no_copy']):
+                    created = self.copy(rows)
+                else:
+                    created = self.insert(rows, options['batch_size'])
+        except OSError as error:
+            raise CommandError(
+                f'Не удалось прочитать файл "{path}": {error}')
+        except (UnicodeDecodeError, csv.Error) as error:
+            raise CommandError(
+                f'Ошибка разбора файла "{path}": {error}')
+
+        if created:
+            # Сбрасывает поисковый индекс и кэш рецептов
+            ingredients_imported.send(sender=Ingredient)
+
+        # Справочник содержит только ключевые поля, поэтому
+        # обновлять у существующих записей нечего.
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные успешно загружены! Прочитано строк: {self.total}, '
+            f'добавлено: {created}, обновлено: 0, '
+            f'пропущено: {self.total - self.invalid - created}, '
+            f'некорректных: {self.invalid}'
+        ))
+
+    def clean_rows(self, rows):
+        for row in rows:
+            self.total += 1
+            pair = clean(row)
+            if pair is None:
+                self.invalid += 1
+                continue
+            yield pair
+
+    def insert(self, rows, batch_size):
+        """Вставка пачками; уже существующие записи пропускаются."""
+        created = 0
+        while batch := dict.fromkeys(islice(rows, batch_size)):
+            existing = set(
+                Ingredient.objects
+                .filter(name__in={name for name, _ in batch})
+                .values_list('name', 'measurement_unit')
+            )
+            new = [
+                Ingredient(name=name, measurement_unit=unit)
+                for name, unit in batch if (name, unit) not in existing
+            ]
+            Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+            created += len(new)
+        return created
+
+    def copy(self, rows):
+        """Загрузка через COPY во временную таблицу и INSERT ... ON
+        CONFLICT DO NOTHING в справочник."""
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_import '
+                '(name text, measurement_unit text) ON COMMIT DROP')
+            cursor.copy_expert(
+                'COPY ingredient_import FROM STDIN WITH (FORMAT csv)',
+                CopyBuffer(rows))
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_import '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING')
+            return cursor.rowcount
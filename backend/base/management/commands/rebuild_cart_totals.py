@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from base.models import RecipeIngredient, ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = 'Перестроение или проверка итогов корзин покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сравнить итоги с корзинами, не изменяя данные')
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            ShoppingCartTotal.objects.refresh()
+            self.stdout.write(self.style.SUCCESS(
+                'Итоги корзин перестроены. '
+                f'Записей: {ShoppingCartTotal.objects.count()}'
+            ))
+            return
+
+        expected = {
+            (row['recipe__shoppingcart__user_id'], row['ingredient_id']):
+                row['total']
+            for row in ShoppingCartTotal.objects.aggregate_source(
+                RecipeIngredient.objects.filter(
+                    recipe__shoppingcart__isnull=False))
+        }
+        stored = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in
+            ShoppingCartTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            ).iterator(chunk_size=2000)
+        }
+        mismatched = {
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        }
+        if mismatched:
+            self.stdout.write(self.style.ERROR(
+                f'Расхождений: {len(mismatched)}. '
+                'Запустите команду без --verify для перестройки.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Итоги корзин актуальны.'))
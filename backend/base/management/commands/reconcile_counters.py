@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Max
+from base.models import counter_fields
+
+
+class Command(BaseCommand):
+    help = ('Сверка счётчиков рецептов, подписчиков и избранного '
+            'с фактическими связями и исправление расхождений')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Ширина диапазона id, проверяемого за один запрос')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, не исправляя их')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+        for model, field, actual in counter_fields():
+            last_id = model.objects.aggregate(last=Max('pk'))['last'] or 0
+            fixed = 0
+            for start in range(0, last_id, batch_size):
+                # Диапазон id, а не смещение: каждая пачка — один
+                # индексный просмотр, а транзакции остаются короткими
+                with transaction.atomic():
+                    stale = (
+                        model.objects
+                        .filter(pk__gt=start, pk__lte=start + batch_size)
+                        .annotate(actual=actual)
+                        .exclude(**{field: F('actual')})
+                        .select_for_update(of=('self',))
+                        .only('pk')
+                    )
+                    objects = []
+                    for obj in stale:
+                        setattr(obj, field, obj.actual)
+                        objects.append(obj)
+                    if objects and not options['dry_run']:
+                        model.objects.bulk_update(objects, [field])
+                fixed += len(objects)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}.{field}: '
+                f'{"расхождений" if options["dry_run"] else "исправлено"} '
+                f'{fixed}')
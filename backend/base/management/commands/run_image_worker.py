@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from base.models import ImageTask
+
+
+class Command(BaseCommand):
+    help = 'Воркер очереди обработки изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=10,
+                            help='Сколько задач забирать за раз')
+        parser.add_argument('--sleep', type=float, default=2.0,
+                            help='Пауза при пустой очереди, секунд')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить доступные задачи и завершиться')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            tasks = ImageTask.objects.claim(options['batch'])
+            for task in tasks:
+                try:
+                    task.run()
+                except Exception as error:
+                    self.stdout.write(self.style.ERROR(
+                        f'{task} (попытка {task.attempts}): {error!r}'))
+                else:
+                    self.stdout.write(f'{task}: готово')
+            if tasks:
+                continue
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
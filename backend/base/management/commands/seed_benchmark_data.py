@@ -0,0 +1,198 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.timezone import now
+from base.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                         ShoppingCart, ShoppingCartTotal, Subscription,
+                         refresh_counters)
+
+User = get_user_model()
+
+EMAIL_DOMAIN = 'bench.example.com'
+PASSWORD = 'benchmark'
+
+
+def skewed_weights(count, exponent):
+    """Веса по закону Ципфа: немногие объекты получают основную долю."""
+    return list(accumulate(1 / rank ** exponent for rank in
+                           range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = ('Генерация синтетических пользователей, рецептов, избранного, '
+            'корзин и подписок для нагрузочных замеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Среднее число ингредиентов в рецепте')
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число рецептов в избранном у пользователя')
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Среднее число рецептов в корзине у пользователя')
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Среднее число подписок у пользователя')
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее сгенерированные данные перед генерацией')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.skew = options['skew']
+        if options['users'] < 1:
+            raise CommandError('--users должен быть положительным.')
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Справочник ингредиентов пуст. '
+                'Выполните сначала import_ingredients.')
+        if options['clear']:
+            deleted, _ = User.objects.filter(
+                email__endswith=f'@{EMAIL_DOMAIN}').delete()
+            self.stdout.write(f'Удалено объектов: {deleted}')
+        elif User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').exists():
+            raise CommandError(
+                'Данные для замеров уже сгенерированы. Используйте --clear.')
+
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                user_ids, options['recipes'])
+            self.create_recipe_ingredients(
+                recipe_ids, ingredient_ids,
+                options['ingredients_per_recipe'])
+            self.create_relations(
+                Favorite, 'recipe_id', user_ids, recipe_ids,
+                options['favorites'])
+            self.create_relations(
+                ShoppingCart, 'recipe_id', user_ids, recipe_ids,
+                options['carts'])
+            self.create_relations(
+                Subscription, 'author_id', user_ids, user_ids,
+                options['follows'])
+            ShoppingCartTotal.objects.refresh(user_ids=user_ids)
+            refresh_counters(user_ids=user_ids, recipe_ids=recipe_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Пароль пользователей *@{EMAIL_DOMAIN}: {PASSWORD}'))
+
+    def pick(self, population, weights, count):
+        """Неповторяющаяся выборка с перекосом в начало списка."""
+        count = min(count, len(population))
+        if count * 4 > len(population):
+            # Выборка с весами почти всей совокупности сходится медленно
+            return self.random.sample(population, count)
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(self.random.choices(
+                population, cum_weights=weights, k=count - len(chosen)))
+        return chosen
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            (
+                User(
+                    email=f'user{number}@{EMAIL_DOMAIN}',
+                    username=f'bench_user{number}',
+                    first_name='Имя',
+                    last_name=f'Фамилия {number}',
+                    password=password,
+                )
+                for number in range(count)
+            ),
+            batch_size=self.batch_size,
+        )
+        user_ids = list(
+            User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+            .order_by('id').values_list('id', flat=True))
+        self.stdout.write(f'Пользователей: {len(user_ids)}')
+        return user_ids
+
+    def create_recipes(self, user_ids, count):
+        # Немногие авторы пишут большую часть рецептов
+        authors = self.random.choices(
+            user_ids, cum_weights=skewed_weights(len(user_ids), self.skew),
+            k=count)
+        published = now()
+        recipes = Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=author_id,
+                    name=f'Рецепт {number}',
+                    text='Описание рецепта для нагрузочных замеров. ' * 5,
+                    image='recipes/images/benchmark.jpg',
+                    cooking_time=self.random.randint(5, 180),
+                    date_published=published - timedelta(
+                        minutes=self.random.randint(0, 365 * 24 * 60)),
+                )
+                for number, author_id in enumerate(authors)
+            ),
+            batch_size=self.batch_size,
+        )
+        self.stdout.write(f'Рецептов: {len(recipes)}')
+        return [recipe.pk for recipe in recipes]
+
+    def create_recipe_ingredients(self, recipe_ids, ingredient_ids, average):
+        weights = skewed_weights(len(ingredient_ids), self.skew / 2)
+        total = 0
+        batch = []
+        for recipe_id in recipe_ids:
+            count = max(1, round(self.random.gauss(average, average / 3)))
+            batch.extend(
+                RecipeIngredient(recipe_id=recipe_id,
+                                 ingredient_id=ingredient_id,
+                                 amount=self.random.randint(1, 500))
+                for ingredient_id in self.pick(
+                    ingredient_ids, weights, count)
+            )
+            if len(batch) >= self.batch_size:
+                total += len(RecipeIngredient.objects.bulk_create(batch))
+                batch = []
+        total += len(RecipeIngredient.objects.bulk_create(batch))
+        self.stdout.write(f'Ингредиентов рецептов: {total}')
+
+    def create_relations(self, model, target, user_ids, target_ids,
+                         average):
+        """Связи пользователей с популярными рецептами или авторами;
+        активность пользователей тоже неравномерна."""
+        target_weights = skewed_weights(len(target_ids), self.skew)
+        # У подписок нет даты добавления
+        dated = model is not Subscription
+        current = now()
+        total = 0
+        batch = []
+        for user_id in user_ids:
+            count = min(int(self.random.expovariate(1 / average)) if average
+                        else 0, len(target_ids) - 1)
+            batch.extend(
+                model(user_id=user_id, **{target: target_id},
+                      **self.added_at(current) if dated else {})
+                for target_id in self.pick(target_ids, target_weights, count)
+                if dated or target_id != user_id
+            )
+            if len(batch) >= self.batch_size:
+                total += len(model.objects.bulk_create(batch))
+                batch = []
+        total += len(model.objects.bulk_create(batch))
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {total}')
+
+    def added_at(self, current):
+        """Дата добавления за последние 90 дней — для рейтингов."""
+        return {'added_at': current - timedelta(
+            minutes=self.random.randint(0, 90 * 24 * 60))}
@@ -0,0 +1,119 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils.timezone import now
+from base.models import Favorite, Recipe, ShoppingCart
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт рейтингов рецептов для сортировки ?ordering=popular '
+            'и ?ordering=trending')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--favorite-weight', type=float, default=1.0,
+            help='Вес добавления в избранное')
+        parser.add_argument(
+            '--cart-weight', type=float, default=2.0,
+            help='Вес добавления в корзину')
+        parser.add_argument(
+            '--popular-half-life', type=float, default=90,
+            help='Период полураспада популярности, дней')
+        parser.add_argument(
+            '--trending-half-life', type=float, default=24,
+            help='Период полураспада для «набирающих популярность», часов')
+        parser.add_argument(
+            '--trending-window', type=float, default=7,
+            help='Учитываемый период для «набирающих популярность», дней')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--interval', type=float,
+            help='Пересчитывать каждые N секунд, не завершаясь')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+        if min(options['popular_half_life'],
+               options['trending_half_life']) <= 0:
+            raise CommandError('Период полураспада должен быть '
+                               'положительным.')
+        while True:
+            close_old_connections()
+            started = time.monotonic()
+            updated = self.update(options)
+            self.stdout.write(
+                f'Обновлено рейтингов: {updated} '
+                f'за {time.monotonic() - started:.1f} с')
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    def update(self, options):
+        current = now()
+        weights = ((Favorite, options['favorite_weight']),
+                   (ShoppingCart, options['cart_weight']))
+        popularity = self.scores(
+            weights, current, TruncDay,
+            timedelta(days=options['popular_half_life']))
+        trending = self.scores(
+            weights, current, TruncHour,
+            timedelta(hours=options['trending_half_life']),
+            since=current - timedelta(days=options['trending_window']))
+
+        updated = 0
+        batch = []
+        # Записываются только изменившиеся значения; рецепты без
+        # добавлений за период получают нулевой рейтинг
+        for pk, old_popularity, old_trending in (
+            Recipe.objects.order_by('pk')
+            .values_list('pk', 'popularity_score', 'trending_score')
+            .iterator(chunk_size=options['batch_size'])
+        ):
+            new_popularity = popularity.get(pk, 0)
+            new_trending = trending.get(pk, 0)
+            if (new_popularity, new_trending) != (old_popularity,
+                                                  old_trending):
+                batch.append(Recipe(pk=pk, popularity_score=new_popularity,
+                                    trending_score=new_trending))
+            if len(batch) >= options['batch_size']:
+                updated += self.save(batch)
+                batch = []
+        return updated + self.save(batch)
+
+    @staticmethod
+    def scores(weights, current, trunc, half_life, since=None):
+        """Сумма весов добавлений с экспоненциальным затуханием.
+
+        Добавления группируются в базе по рецепту и часу или дню, так
+        что в память попадает не больше строк, чем таких групп.
+        """
+        scores = defaultdict(float)
+        for model, weight in weights:
+            relations = model.objects.all()
+            if since is not None:
+                relations = relations.filter(added_at__gte=since)
+            for row in (
+                relations
+                .annotate(bucket=trunc('added_at'))
+                .values('recipe_id', 'bucket')
+                .annotate(total=Count('id'))
+                .order_by()
+                .iterator(chunk_size=5000)
+            ):
+                age = max(current - row['bucket'], timedelta())
+                scores[row['recipe_id']] += (
+                    weight * row['total'] * 0.5 ** (age / half_life))
+        # Округление убирает перезапись из-за шума в последних разрядах
+        return {pk: round(score, 6) for pk, score in scores.items()}
+
+    @staticmethod
+    def save(batch):
+        with transaction.atomic():
+            Recipe.objects.bulk_update(
+                batch, ['popularity_score', 'trending_score'])
+        return len(batch)
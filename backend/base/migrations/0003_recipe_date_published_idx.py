@@ -0,0 +1,17 @@
+# Generated by Django 4.2.29 on 2026-10-18 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0002_alter_siteuser_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-date_published', '-id'], name='recipe_date_published_idx'),
+        ),
+    ]
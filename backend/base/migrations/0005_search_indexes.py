@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Индексы нужны только в PostgreSQL: на SQLite (тестовые настройки)
+# поиск выполняется через icontains без специальных индексов.
+CREATE_SQL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ingredient_name_trgm_idx '
+    'ON base_ingredient USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS recipe_name_trgm_idx '
+    'ON base_recipe USING gin (name gin_trgm_ops)',
+    # Выражение совпадает с SearchVector('text', config='russian')
+    'CREATE INDEX IF NOT EXISTS recipe_text_search_idx '
+    'ON base_recipe USING gin '
+    "(to_tsvector('russian'::regconfig, COALESCE(text, '')))",
+)
+DROP_SQL = (
+    'DROP INDEX IF EXISTS recipe_text_search_idx',
+    'DROP INDEX IF EXISTS recipe_name_trgm_idx',
+    'DROP INDEX IF EXISTS ingredient_name_trgm_idx',
+)
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0004_shoppingcarttotal'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(CREATE_SQL), run_on_postgresql(DROP_SQL)),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.29 on 2026-10-18 05:43
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    """Сливает дубли ингредиентов в запись с наименьшим id."""
+    Ingredient = apps.get_model('base', 'Ingredient')
+    RecipeIngredient = apps.get_model('base', 'RecipeIngredient')
+    ShoppingCartTotal = apps.get_model('base', 'ShoppingCartTotal')
+    groups = (
+        Ingredient.objects
+        .values('name', 'measurement_unit')
+        .annotate(keep_id=models.Min('id'), total=models.Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for group in groups:
+        keep_id = group['keep_id']
+        duplicate_ids = list(
+            Ingredient.objects
+            .filter(name=group['name'],
+                    measurement_unit=group['measurement_unit'])
+            .exclude(id=keep_id)
+            .values_list('id', flat=True)
+        )
+        for item in RecipeIngredient.objects.filter(
+                ingredient_id__in=duplicate_ids):
+            kept = RecipeIngredient.objects.filter(
+                recipe_id=item.recipe_id, ingredient_id=keep_id).first()
+            if kept is None:
+                item.ingredient_id = keep_id
+                item.save(update_fields=['ingredient'])
+            else:
+                kept.amount += item.amount
+                kept.save(update_fields=['amount'])
+                item.delete()
+        # Итоги корзин по слитым ингредиентам пересчитываются заново
+        ShoppingCartTotal.objects.filter(
+            ingredient_id__in=[keep_id, *duplicate_ids]).delete()
+        ShoppingCartTotal.objects.bulk_create(
+            ShoppingCartTotal(
+                user_id=row['recipe__shoppingcart__user_id'],
+                ingredient_id=keep_id,
+                total_amount=row['total'],
+            )
+            for row in (
+                RecipeIngredient.objects
+                .filter(ingredient_id=keep_id,
+                        recipe__shoppingcart__isnull=False)
+                .values('recipe__shoppingcart__user_id')
+                .annotate(total=models.Sum('amount'))
+                .order_by()
+            )
+        )
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_imagetask'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
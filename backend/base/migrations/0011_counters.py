@@ -0,0 +1,54 @@
+# Generated by Django 4.2.29 on 2026-10-18 05:55
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    """Подзапрос: число строк ``model`` со ссылкой ``field`` на объект."""
+    return Coalesce(models.Subquery(
+        model.objects
+        .filter(**{field: models.OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=models.Count('id'))
+        .values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('base', 'Recipe')
+    SiteUser = apps.get_model('base', 'SiteUser')
+    Favorite = apps.get_model('base', 'Favorite')
+    Subscription = apps.get_model('base', 'Subscription')
+    Recipe.objects.update(favorites_count=count_of(Favorite, 'recipe'))
+    SiteUser.objects.update(
+        recipes_count=count_of(Recipe, 'author'),
+        subscribers_count=count_of(Subscription, 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_ingredient_unique_name_unit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='siteuser',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.AddField(
+            model_name='siteuser',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.29 on 2026-10-18 06:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def backdate_relations(apps, schema_editor):
+    """Время добавления существующих связей неизвестно; берётся дата
+    публикации рецепта, чтобы старые связи не попали в «набирающие
+    популярность»."""
+    Recipe = apps.get_model('base', 'Recipe')
+    for name in ('Favorite', 'ShoppingCart'):
+        apps.get_model('base', name).objects.update(added_at=models.Subquery(
+            Recipe.objects.filter(pk=models.OuterRef('recipe_id'))
+            .values('date_published')[:1]
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='added_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Набирает популярность'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='added_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity_score', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-id'], name='recipe_trending_idx'),
+        ),
+        migrations.RunPython(backdate_relations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.29 on 2026-10-18 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0012_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-date_published', '-id'], name='recipe_author_date_idx'),
+        ),
+    ]
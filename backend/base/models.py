@@ -1,9 +1,19 @@
-from django.db import models
+import logging
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, RowNumber
 from django.core.validators import MinValueValidator
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
 from django.utils.timezone import now
 
+from .images import delete_renditions, update_renditions
+
+logger = logging.getLogger(__name__)
+
 
 # Кастомная модель пользователя
 class SiteUser(AbstractUser):
@@ -11,6 +21,11 @@ class SiteUser(AbstractUser):
                                blank=True,
                                null=True,
                                verbose_name='Аватарка')
+    avatar_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии аватарки')
     email = models.EmailField(max_length=254,
                               unique=True,
                               verbose_name='Электронная почта')
@@ -22,6 +37,16 @@ class SiteUser(AbstractUser):
                                   verbose_name='Имя')
     last_name = models.CharField(max_length=150,
                                  verbose_name='Фамилия')
+    # Счётчики обновляются вместе с изменением связей
+    # (см. api/views.py), расхождения исправляет reconcile_counters
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов')
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -51,6 +76,9 @@ class Ingredient(models.Model):
         verbose_name='Ед. измерения')
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'measurement_unit'],
+                                    name='unique_ingredient_name_unit')]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
@@ -59,6 +87,76 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Запросы к рецептам."""
+
+    def with_user_annotations(self, user):
+        """Аннотирует рецепты признаками избранного, корзины и подписки
+        на автора для пользователя и подгружает связанные объекты,
+        чтобы страница ленты выбиралась фиксированным числом запросов."""
+        queryset = self.select_related('author').prefetch_related(
+            models.Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient')
+            )
+        )
+        if not user.is_authenticated:
+            false = models.Value(False, output_field=models.BooleanField())
+            return queryset.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                author_is_subscribed=false,
+            )
+        return queryset.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            author_is_subscribed=models.Exists(Subscription.objects.filter(
+                user=user, author=models.OuterRef('author'))),
+        )
+
+    def latest_per_author(self, limit=None):
+        """Оставляет не более ``limit`` последних рецептов каждого автора.
+
+        Нумерация рецептов внутри автора выполняется оконной функцией
+        ``ROW_NUMBER()`` в БД, поэтому с ``Prefetch`` по авторам
+        выбираются только нужные строки.
+        """
+        if limit is None:
+            return self
+        return self.annotate(
+            author_row_number=models.Window(
+                expression=RowNumber(),
+                partition_by=models.F('author_id'),
+                order_by=(models.F('date_published').desc(),
+                          models.F('id').desc()),
+            )
+        ).filter(author_row_number__lte=limit)
+
+    def followed_by(self, user, page_size):
+        """Рецепты авторов, на которых подписан пользователь.
+
+        Если у этих авторов немного рецептов, их дешевле выбрать по
+        индексу (author, -date_published) и отсортировать. Если много —
+        выгоднее просматривать индекс по дате публикации, проверяя
+        подписку для каждой строки: страница набирается примерно за
+        ``page_size * всего / подходящих`` строк и не зависит от числа
+        подписок. Выбор делается по счётчикам рецептов авторов.
+        """
+        subscriptions = Subscription.objects.filter(user=user)
+        followed = User.objects.filter(authors__user=user).aggregate(
+            total=models.Sum('recipes_count'))['total'] or 0
+        # Максимальный id вместо COUNT(*): одно обращение к индексу
+        last_id = self.model.objects.aggregate(
+            last=models.Max('pk'))['last'] or 0
+        if followed ** 2 > page_size * last_id:
+            return self.filter(models.Exists(subscriptions.filter(
+                author=models.OuterRef('author'))))
+        return self.filter(author__in=subscriptions.values('author_id'))
+
+
 # Модель рецепта
 class Recipe(models.Model):
     author = models.ForeignKey(
@@ -72,6 +170,11 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='recipes/images',
         verbose_name='Изображение')
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения')
     text = models.TextField(verbose_name='Описание')
     cooking_time = models.PositiveIntegerField(
         validators=[MinValueValidator(1)],
@@ -80,11 +183,40 @@ class Recipe(models.Model):
         default=now,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном')
+    # Рейтинги пересчитываются периодически командой update_recipe_scores
+    popularity_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Популярность')
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Набирает популярность')
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-date_published']
+        indexes = [
+            models.Index(fields=['-date_published', '-id'],
+                         name='recipe_date_published_idx'),
+            models.Index(fields=['-popularity_score', '-id'],
+                         name='recipe_popularity_idx'),
+            models.Index(fields=['-trending_score', '-id'],
+                         name='recipe_trending_idx'),
+            models.Index(fields=['author', '-date_published', '-id'],
+                         name='recipe_author_date_idx'),
+        ]
 
     def get_absolute_url(self):
         return f'/recipes/{self.pk}'
@@ -105,6 +237,11 @@ class BaseUserRecipeRelation(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт'
     )
+    added_at = models.DateTimeField(
+        default=now,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         abstract = True
@@ -161,6 +298,43 @@ class Subscription(models.Model):
         return f'{self.user.username} подписан на {self.author.username}'
 
 
+def related_count(model, field):
+    """Подзапрос: число строк ``model``, ссылающихся на объект
+    через ``field``."""
+    return Coalesce(models.Subquery(
+        model.objects
+        .filter(**{field: models.OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=models.Count('id'))
+        .values('total')
+    ), 0)
+
+
+def counter_fields():
+    """Денормализованные счётчики: модель, поле и подзапрос
+    с фактическим значением."""
+    return (
+        (User, 'recipes_count', related_count(Recipe, 'author')),
+        (User, 'subscribers_count', related_count(Subscription, 'author')),
+        (Recipe, 'favorites_count', related_count(Favorite, 'recipe')),
+    )
+
+
+def refresh_counters(user_ids=None, recipe_ids=None):
+    """Пересчитывает счётчики после массовых изменений в обход API.
+
+    ``None`` снимает ограничение, так что вызов без аргументов
+    пересчитывает все объекты.
+    """
+    for model, field, actual in counter_fields():
+        ids = user_ids if model is User else recipe_ids
+        queryset = model.objects.all()
+        if ids is not None:
+            queryset = queryset.filter(pk__in=list(ids))
+        queryset.update(**{field: actual})
+
+
 # Модель для связи рецепта и ингредиента
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
@@ -185,3 +359,213 @@ class RecipeIngredient(models.Model):
 
     def __str__(self):
         return f'{self.amount} {self.ingredient} в {self.recipe.name}'
+
+
+class ShoppingCartTotalManager(models.Manager):
+    """Поддержка итогов корзины в актуальном состоянии."""
+
+    def refresh(self, user_ids=None, ingredient_ids=None):
+        """Пересчитывает итоги для пользователей и ингредиентов.
+
+        Затрагиваются только переданные ключи; ``None`` снимает
+        ограничение, так что вызов без аргументов перестраивает таблицу
+        целиком. Изменения корзин и ингредиентов рецептов через ORM
+        учитываются сигналами (``base/signals.py``); после
+        ``bulk_create`` и ``update()`` метод вызывается явно.
+        """
+        totals = self.all()
+        # Условия на корзину задаются одним filter(): каждый следующий
+        # вызов по многозначной связи добавил бы ещё один JOIN, и суммы
+        # умножились бы на число корзин с рецептом
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            totals = totals.filter(user_id__in=user_ids)
+            source = RecipeIngredient.objects.filter(
+                recipe__shoppingcart__user_id__in=user_ids)
+        else:
+            source = RecipeIngredient.objects.filter(
+                recipe__shoppingcart__isnull=False)
+        if ingredient_ids is not None:
+            ingredient_ids = list(ingredient_ids)
+            totals = totals.filter(ingredient_id__in=ingredient_ids)
+            source = source.filter(ingredient_id__in=ingredient_ids)
+        with transaction.atomic():
+            if user_ids is not None:
+                # Одновременные пересчёты для одного пользователя
+                # выполняются по очереди: иначе оба удалили бы старые
+                # строки и вставили одинаковые ключи. Порядок блокировки
+                # исключает взаимоблокировки.
+                list(SiteUser.objects.select_for_update()
+                     .filter(pk__in=user_ids).order_by('pk')
+                     .values_list('pk', flat=True))
+            totals.delete()
+            self.bulk_create(
+                (
+                    self.model(
+                        user_id=row['recipe__shoppingcart__user_id'],
+                        ingredient_id=row['ingredient_id'],
+                        total_amount=row['total'],
+                    )
+                    for row in self.aggregate_source(source)
+                ),
+                batch_size=1000,
+            )
+
+    @staticmethod
+    def aggregate_source(source):
+        """Суммы количеств ингредиентов по пользователям."""
+        return (
+            source
+            .values('recipe__shoppingcart__user_id', 'ingredient_id')
+            .annotate(total=models.Sum('amount'))
+            .order_by()
+            .iterator(chunk_size=2000)
+        )
+
+
+# Итоги корзины покупок, поддерживаемые при изменении корзины и рецептов
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент')
+    total_amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    objects = ShoppingCartTotalManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique_cart_total_user_ingredient')]
+        verbose_name = 'Итог корзины покупок'
+        verbose_name_plural = 'Итоги корзин покупок'
+
+    def __str__(self):
+        return f'{self.user.username}: {self.total_amount} {self.ingredient}'
+
+
+class ImageTaskManager(models.Manager):
+    """Очередь задач на построение уменьшенных копий изображений."""
+
+    def enqueue(self, instance, field_name):
+        """Ставит изображение в очередь, сбрасывая старые копии.
+
+        Пока задача не выполнена, поле ``<поле>_renditions`` пустое.
+        При ``IMAGE_TASKS_EAGER`` копии строятся сразу.
+        """
+        renditions_field = f'{field_name}_renditions'
+        field_file = getattr(instance, field_name)
+        delete_renditions(field_file.storage,
+                          getattr(instance, renditions_field) or {})
+        setattr(instance, renditions_field, {})
+        instance.save(update_fields=[renditions_field])
+        if not field_file:
+            return None
+        task = self.create(
+            model=instance._meta.label_lower,
+            object_id=instance.pk,
+            field_name=field_name,
+            file_name=field_file.name,
+        )
+        if settings.IMAGE_TASKS_EAGER:
+            try:
+                task.run()
+            except Exception:
+                # Задача осталась в очереди и будет повторена воркером
+                logger.exception('Ошибка обработки изображения %s', task)
+            else:
+                instance.refresh_from_db(fields=[renditions_field])
+        return task
+
+    def claim(self, limit):
+        """Забирает готовые к выполнению задачи, продлевая их аренду.
+
+        Задачи, взятые упавшим воркером, снова становятся доступны
+        после истечения аренды.
+        """
+        with transaction.atomic():
+            tasks = list(
+                self.select_for_update(skip_locked=True)
+                .filter(status__in=(ImageTask.Status.PENDING,
+                                    ImageTask.Status.RUNNING),
+                        run_after__lte=now())
+                .order_by('run_after')[:limit]
+            )
+            for task in tasks:
+                task.status = ImageTask.Status.RUNNING
+                task.attempts += 1
+                task.run_after = now() + ImageTask.LEASE
+                task.save(update_fields=['status', 'attempts', 'run_after'])
+        return tasks
+
+
+# Задача на построение уменьшенных копий изображения
+class ImageTask(models.Model):
+    MAX_ATTEMPTS = 5
+    LEASE = timedelta(minutes=10)
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        FAILED = 'failed', 'Ошибка'
+
+    model = models.CharField(max_length=64, verbose_name='Модель')
+    object_id = models.PositiveBigIntegerField(verbose_name='ID объекта')
+    field_name = models.CharField(max_length=32, verbose_name='Поле')
+    file_name = models.CharField(max_length=255, verbose_name='Файл')
+    status = models.CharField(
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name='Попыток')
+    run_after = models.DateTimeField(
+        default=now, verbose_name='Выполнить после')
+    last_error = models.TextField(blank=True, verbose_name='Ошибка')
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name='Создана')
+
+    objects = ImageTaskManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'],
+                         name='image_task_queue_idx'),
+        ]
+        verbose_name = 'Обработка изображения'
+        verbose_name_plural = 'Обработка изображений'
+
+    def __str__(self):
+        return f'{self.model}:{self.object_id} {self.field_name}'
+
+    def run(self):
+        """Строит копии; при ошибке откладывает повтор с нарастающей
+        паузой, после ``MAX_ATTEMPTS`` попыток помечает задачу ошибочной.
+        """
+        instance = apps.get_model(self.model).objects.filter(
+            pk=self.object_id).first()
+        # Объект удалён или изображение уже заменено новым
+        if (instance is None
+                or getattr(instance, self.field_name).name != self.file_name):
+            self.delete()
+            return
+        try:
+            update_renditions(instance, self.field_name)
+        except Exception as error:
+            self.last_error = repr(error)
+            if self.attempts >= self.MAX_ATTEMPTS:
+                self.status = self.Status.FAILED
+            else:
+                self.status = self.Status.PENDING
+                self.run_after = now() + timedelta(
+                    seconds=30 * 2 ** self.attempts)
+            self.save(update_fields=['status', 'run_after', 'last_error'])
+            raise
+        self.delete()
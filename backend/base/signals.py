@@ -0,0 +1,45 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .filters import HISTOGRAM_CACHE_KEY
+from .models import (Recipe, RecipeIngredient, ShoppingCart,
+                     ShoppingCartTotal)
+
+# Справочник ингредиентов изменён в обход сигналов моделей
+# (bulk_create, COPY); отправитель — модель Ingredient
+ingredients_imported = Signal()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_cooking_time_histogram(**kwargs):
+    """Сбрасывает гистограмму времени готовки фильтра админки."""
+    cache.delete(HISTOGRAM_CACHE_KEY)
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def refresh_cart_totals_for_cart(instance, **kwargs):
+    """Пересчитывает итоги пользователя по ингредиентам рецепта
+    при добавлении рецепта в корзину или удалении из неё (в том числе
+    каскадном и из админки)."""
+    ingredient_ids = list(RecipeIngredient.objects.filter(
+        recipe_id=instance.recipe_id).values_list('ingredient_id', flat=True))
+    if ingredient_ids:
+        ShoppingCartTotal.objects.refresh([instance.user_id], ingredient_ids)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def refresh_cart_totals_for_ingredient(signal, instance, created=False,
+                                       **kwargs):
+    """Пересчитывает итоги корзин, в которых лежит рецепт, при изменении
+    его ингредиентов."""
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe_id=instance.recipe_id).values_list('user_id', flat=True))
+    if not user_ids:
+        return
+    # При изменении строки мог смениться и сам ингредиент, поэтому
+    # пересчитываются все итоги этих пользователей
+    ShoppingCartTotal.objects.refresh(
+        user_ids,
+        None if signal is post_save and not created
+        else [instance.ingredient_id])
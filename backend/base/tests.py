@@ -0,0 +1,127 @@
+import io
+import shutil
+import tempfile
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from PIL import Image
+from .images import MAX_ORIGINAL_SIDE, update_renditions
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     Subscription)
+from .views import async_short_link, short_link
+
+User = get_user_model()
+
+
+class AdminChangelistQueryCountTests(TestCase):
+    """Число запросов списков админки не зависит от числа строк."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin',
+            first_name='Админ', last_name='Админов', password='password')
+        self.client.force_login(self.admin)
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(3)
+        )
+        self.users = []
+
+    def add_rows(self, count):
+        """Добавляет ``count`` пользователей с рецептами, избранным
+        и подписками."""
+        for _ in range(count):
+            number = len(self.users)
+            user = User.objects.create_user(
+                email=f'user{number}@example.com', username=f'user{number}',
+                first_name='Имя', last_name='Фамилия', password='password')
+            recipe = Recipe.objects.create(
+                author=user, name=f'Рецепт {number}', text='Описание',
+                cooking_time=10 + number, image='recipes/images/test.jpg')
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=10)
+                for ingredient in self.ingredients
+            )
+            for other in self.users:
+                Favorite.objects.create(user=other, recipe=recipe)
+                Subscription.objects.create(user=other, author=user)
+            self.users.append(user)
+
+    def assert_changelist_queries(self, url, count):
+        for rows in (3, 5):
+            self.add_rows(rows)
+            cache.clear()
+            with self.assertNumQueries(count):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_recipe_changelist(self):
+        # Сессия, пользователь, авторы для фильтра, две выборки
+        # гистограммы времени, два COUNT, страница, ингредиенты
+        self.assert_changelist_queries('/admin/base/recipe/', 9)
+
+    def test_user_changelist(self):
+        # Сессия, пользователь, два COUNT, страница с числом подписок
+        self.assert_changelist_queries('/admin/base/siteuser/', 5)
+
+
+class BoundOriginalTests(TestCase):
+    """Уменьшенный оригинал сохраняет свой формат и имя файла."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password')
+
+    def test_keeps_source_format(self):
+        for image_format, extension in (('WEBP', 'webp'), ('GIF', 'gif')):
+            content = io.BytesIO()
+            Image.new('RGB', (3000, 1000), 'red').save(content, image_format)
+            recipe = Recipe.objects.create(
+                author=self.author, name=f'Рецепт {extension}',
+                text='Описание', cooking_time=10,
+                image=SimpleUploadedFile(f'big.{extension}',
+                                         content.getvalue()))
+            name = recipe.image.name
+
+            update_renditions(recipe, 'image')
+
+            self.assertEqual(recipe.image.name, name)
+            with recipe.image.open('rb'):
+                image = Image.open(recipe.image)
+                self.assertEqual(image.format, image_format)
+                self.assertEqual(image.size, (MAX_ORIGINAL_SIDE, 853))
+            self.assertIn('card', recipe.image_renditions)
+
+
+class ShortLinkTests(TestCase):
+    """Синхронная и асинхронная короткие ссылки ведут на рецепт."""
+
+    def test_redirect(self):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password')
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание', cooking_time=10,
+            image='recipes/images/test.jpg')
+        response = self.client.get(f'/s/{recipe.pk}')
+        self.assertRedirects(response, recipe.get_absolute_url(),
+                             fetch_redirect_response=False)
+        self.assertEqual(self.client.get('/s/0').status_code, 404)
+
+        request = RequestFactory().get(f'/s/{recipe.pk}')
+        for view in (short_link, async_to_sync(async_short_link)):
+            self.assertEqual(view(request, recipe.pk)['Location'],
+                             recipe.get_absolute_url())
+            with self.assertRaises(Http404):
+                view(request, 0)
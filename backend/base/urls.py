@@ -1,8 +1,11 @@
+from django.conf import settings
 from django.urls import path
-from .views import short_link
+from .views import async_short_link, short_link
 
 
 urlpatterns = [
     path(
-        's/<int:pk>', short_link, name='short_link'),
+        's/<int:pk>',
+        async_short_link if settings.ASGI_MODE else short_link,
+        name='short_link'),
 ]
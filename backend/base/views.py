@@ -1,10 +1,25 @@
+from django.http import Http404
 from django.shortcuts import redirect
 from .models import Recipe
-from django.shortcuts import get_object_or_404
 
 
 def short_link(request, pk):
-    """Генерация короткой ссылки для рецепта и редирект на неё"""
-    recipe = get_object_or_404(Recipe, pk=pk)
+    """Редирект с короткой ссылки на страницу рецепта."""
+    if not Recipe.objects.filter(pk=pk).exists():
+        raise Http404('Рецепт не найден.')
 
-    return redirect(recipe.get_absolute_url())
+    return redirect(Recipe(pk=pk).get_absolute_url())
+
+
+async def async_short_link(request, pk):
+    """``short_link`` для режима ASGI: ожидание БД не занимает поток.
+
+    Под WSGI асинхронное представление выполнялось бы через
+    ``async_to_sync`` в отдельном цикле событий, что только добавляет
+    задержку, поэтому маршрут к нему подключается только при
+    ``ASGI_MODE``.
+    """
+    if not await Recipe.objects.filter(pk=pk).aexists():
+        raise Http404('Рецепт не найден.')
+
+    return redirect(Recipe(pk=pk).get_absolute_url())
@@ -3,5 +3,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Отключает постоянные соединения с БД и включает асинхронные
+# представления (см. ASGI_MODE в настройках)
+os.environ['DJANGO_ASGI'] = 'True'
 
 application = get_asgi_application()
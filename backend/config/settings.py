@@ -41,10 +41,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
+    'django_filters',
     'corsheaders',
     'import_export',
     'api',
@@ -53,6 +55,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'api.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -85,6 +88,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# Выставляется в config/asgi.py. Под ASGI синхронный код каждого запроса
+# выполняется в отдельном потоке, который после запроса завершается:
+# постоянное соединение такого потока не переиспользуется и не
+# закрывается, поэтому соединения закрываются после каждого запроса.
+ASGI_MODE = os.getenv('DJANGO_ASGI', 'False') == 'True'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -93,10 +102,23 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'foodgram_password'),
         'HOST': os.getenv('DB_HOST', 'db'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # Соединение переиспользуется между запросами потока; перед
+        # повторным использованием проверяется, что оно живо.
+        # 0 — закрывать соединение после каждого запроса.
+        'CONN_MAX_AGE': 0 if ASGI_MODE else int(
+            os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        # При работе через PgBouncer в режиме transaction серверные
+        # курсоры (QuerySet.iterator()) нужно отключить
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True',
     }
 }
 
 
+# Тесты идут на SQLite: поиск (api/search.py) при этом работает через
+# icontains, а индексы pg_trgm и полнотекстовые индексы не создаются.
 if 'test' in sys.argv and DEBUG:
     DATABASES['default'] = {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -136,7 +158,7 @@ USE_TZ = True
 USE_L10N = True
 
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CursorOrPageNumberPagination',
     'PAGE_SIZE': 6,
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly'],
@@ -145,6 +167,60 @@ REST_FRAMEWORK = {
     ),
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.getenv('REDIS_URL'):
+    # Общий для всех воркеров кэш (пакет redis в requirements.txt)
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
+# Время жизни закэшированных ответов на анонимные запросы к рецептам
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60))
+
+# Наибольший размер декодированного изображения, загружаемого в base64
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 5 * 1024 * 1024))
+
+# Уменьшенные копии изображений строит воркер run_image_worker;
+# при True они строятся сразу в запросе (удобно для разработки и тестов)
+IMAGE_TASKS_EAGER = os.getenv('IMAGE_TASKS_EAGER', 'False') == 'True'
+
+# Поиск ингредиентов по индексу в памяти процесса
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 100))
+
+# Запросы с большим числом SQL-запросов пишутся в лог вместе с SQL;
+# 0 отключает проверку
+QUERY_COUNT_LOG_THRESHOLD = int(os.getenv('QUERY_COUNT_LOG_THRESHOLD', 50))
+
+# Если задан, /metrics требует заголовок Authorization: Bearer <токен>
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.requests': {
+            'handlers': ['console'],
+            # INFO — JSON-строка на каждый запрос, WARNING — только
+            # запросы с числом SQL-запросов выше порога. В тестах лог
+            # молчит, если уровень не задан явно.
+            'level': os.getenv(
+                'REQUEST_LOG_LEVEL',
+                'ERROR' if 'test' in sys.argv else 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 
 DJOSER = {
     'LOGIN_FIELD': 'email',
@@ -0,0 +1,35 @@
+"""Настройки gunicorn (файл подхватывается из рабочего каталога)."""
+import os
+import shutil
+
+# Каждый поток держит своё постоянное соединение с БД (CONN_MAX_AGE),
+# поэтому на контейнер приходится до workers * threads соединений;
+# сумма по всем контейнерам должна укладываться в max_connections
+# PostgreSQL (или в размер пула PgBouncer).
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+# GUNICORN_ASGI=True запускает приложение через воркеры uvicorn:
+# асинхронные представления (короткие ссылки, чтение рецептов
+# и ингредиентов, см. api/async_views.py) не занимают поток на время
+# ожидания БД, синхронные представления DRF выполняются в пуле потоков.
+# Постоянные соединения с БД в этом режиме отключаются (CONN_MAX_AGE=0).
+if os.getenv('GUNICORN_ASGI', 'False') == 'True':
+    wsgi_app = 'config.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'config.wsgi:application'
+
+
+def on_starting(server):
+    # Метрики прошлого запуска не должны попадать в новые значения
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)